@@ -4,6 +4,31 @@ from tienda.models import Producto
 from cupones.models import Cupon
 
 
+def calcular_resumen(carro):
+    '''
+        Resumen compacto del carro (unidades y total) calculado solo con los
+        datos de la sesión, sin consultar productos.
+    '''
+    return {
+        'cantidad': sum(item['cantidad'] for item in carro.values()),
+        'total': str(sum(
+            (Decimal(item['precio']) * item['cantidad'] for item in carro.values()),
+            Decimal('0')
+        )),
+    }
+
+
+def obtener_resumen(session):
+    '''
+        Devuelve el resumen guardado en la sesión por Carro.guardar(), o lo
+        calcula si la sesión es anterior a este resumen.
+    '''
+    resumen = session.get(settings.ID_SESSION_RESUMEN_CARRO)
+    if resumen is None:
+        resumen = calcular_resumen(session.get(settings.ID_SESSION_CARRO) or {})
+    return resumen
+
+
 class Carro:
     def __init__(self, request):
         '''
@@ -20,6 +45,19 @@ class Carro:
         self.carro = carro
         # Almacena en el objeto Carro el cupon actualmente aplicado.
         self.id_cupon = self.session.get('id_cupon')
+        # Datos calculados una sola vez por petición (ver invalidar()).
+        self._cupon = None
+        self._cupon_cargado = False
+        self.invalidar()
+
+    def invalidar(self):
+        '''
+            Descarta los items hidratados y los totales memorizados. Se llama
+            cada vez que cambia el contenido del carro.
+        '''
+        self._items = None
+        self._precio_total = None
+        self._descuento = None
 
     def aniadir(self, producto, cantidad=1, actualizar_cantidad=False):
         '''
@@ -48,8 +86,23 @@ class Carro:
         self.guardar()
 
     def guardar(self):
+        # Guarda el resumen que usa la barra de navegación (ver
+        # context_processors.py) para no tener que hidratar el carro.
+        self.session[settings.ID_SESSION_RESUMEN_CARRO] = calcular_resumen(
+            self.carro
+        )
         # Marca la session como modificada para asegurarse que se ha guardado
         self.session.modified = True
+        self.invalidar()
+
+    def actualizar_precio(self, producto):
+        '''
+            Sustituye el precio guardado en el carro por el precio actual.
+        '''
+        id_producto = str(producto.id)
+        if id_producto in self.carro:
+            self.carro[id_producto]['precio'] = str(producto.precio)
+            self.guardar()
 
     def eliminar(self, producto):
         '''
@@ -62,20 +115,50 @@ class Carro:
             del self.carro[id_producto]
             self.guardar()
 
+    def obtener_items(self):
+        '''
+            Hidrata los items del carro con una sola consulta de productos y
+            los memoriza, de modo que recorrer el carro varias veces en la
+            misma petición (vista, plantillas...) no repite la consulta.
+            Los items son dicts nuevos; del carro de la sesión solo se quitan
+            los productos eliminados del catálogo.
+        '''
+        if self._items is None:
+            productos = Producto.objects.filter(
+                id__in=self.carro.keys()
+            ).select_related('categoria')
+            productos = {str(producto.id): producto for producto in productos}
+            # Quita los productos eliminados del catálogo para que el total,
+            # el número de unidades y el resumen coincidan con lo mostrado.
+            eliminados = [
+                id_producto for id_producto in self.carro
+                if id_producto not in productos
+            ]
+            if eliminados:
+                for id_producto in eliminados:
+                    del self.carro[id_producto]
+                self.session[settings.ID_SESSION_RESUMEN_CARRO] = (
+                    calcular_resumen(self.carro)
+                )
+                self.session.modified = True
+                self._precio_total = None
+                self._descuento = None
+            self._items = []
+            for id_producto, item in self.carro.items():
+                precio = Decimal(item['precio'])
+                self._items.append({
+                    'producto': productos[id_producto],
+                    'cantidad': item['cantidad'],
+                    'precio': precio,
+                    'precio_total': precio * item['cantidad'],
+                })
+        return self._items
+
     def __iter__(self):
         '''
-            Definición de métdo __iter__(), itera y obtiene los productos
-            desde la base de datos.
+            Definición de métdo __iter__(), itera los items hidratados.
         '''
-        ids_productos = self.carro.keys()
-        productos = Producto.objects.filter(id__in=ids_productos)
-        carro = self.carro.copy()
-        for producto in productos:
-            carro[str(producto.id)]['producto'] = producto
-        for item in carro.values():
-            item['precio'] = Decimal(item['precio'])
-            item['precio_total'] = item['precio'] * item['cantidad']
-            yield item
+        return iter(self.obtener_items())
 
     def __len__(self):
         '''
@@ -84,32 +167,42 @@ class Carro:
         return sum(item['cantidad'] for item in self.carro.values())
 
     def precio_total(self):
-        return sum(
-            Decimal(item['precio']) * item['cantidad']
-            for item in self.carro.values()
-        )
+        if self._precio_total is None:
+            self._precio_total = sum(
+                (item['precio_total'] for item in self.obtener_items()),
+                Decimal('0')
+            )
+        return self._precio_total
 
     def limpiar(self):
-        # Elimina el carro de la sesión
+        # Elimina el carro y su resumen de la sesión
         del self.session[settings.ID_SESSION_CARRO]
-        self.guardar()
+        self.session.pop(settings.ID_SESSION_RESUMEN_CARRO, None)
+        self.carro = {}
+        self.session.modified = True
+        self.invalidar()
 
     @property
     def cupon(self):
-        if self.id_cupon:
-            try:
-                return Cupon.objects.get(id=self.id_cupon)
-            except Cupon.DoesNotExist:
-                pass
-        return None
+        # El cupón se consulta una sola vez por petición.
+        if not self._cupon_cargado:
+            self._cupon = None
+            if self.id_cupon:
+                self._cupon = Cupon.objects.filter(id=self.id_cupon).first()
+            self._cupon_cargado = True
+        return self._cupon
 
     def obtener_descuento(self):
-        if self.cupon:
-            return (
-                self.cupon.descuento / Decimal('100')
-            ) * self.precio_total()
-            return descuento.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        return Decimal('0.00')
+        if self._descuento is None:
+            self._descuento = Decimal('0.00')
+            if self.cupon:
+                descuento = (
+                    self.cupon.descuento / Decimal('100')
+                ) * self.precio_total()
+                self._descuento = descuento.quantize(
+                    Decimal('0.01'), rounding=ROUND_HALF_UP
+                )
+        return self._descuento
 
     def total_con_descuento(self):
         total = self.precio_total() - self.obtener_descuento()
@@ -1,4 +1,14 @@
-from . carro import Carro
+from django.utils.functional import SimpleLazyObject
+from . carro import Carro, obtener_resumen
 
 def carro(request):
-    return {'carro': Carro(request)}
+    '''
+        El carro y su resumen se crean de forma perezosa: solo se accede a la
+        sesión (y a la base de datos) si la plantilla llega a usarlos.
+    '''
+    return {
+        'carro': SimpleLazyObject(lambda: Carro(request)),
+        'resumen_carro': SimpleLazyObject(
+            lambda: obtener_resumen(request.session)
+        ),
+    }
@@ -1,3 +1,35 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
 from django.test import TestCase
+from tienda.tests import crear_producto
+from .carro import Carro
 
-# Create your tests here.
+
+class CarroTests(TestCase):
+    def setUp(self):
+        self.request = SimpleNamespace(session=SessionStore())
+        self.ram = crear_producto('RAM')
+        self.ssd = crear_producto('SSD')
+        carro = Carro(self.request)
+        carro.aniadir(self.ram, cantidad=2)
+        carro.aniadir(self.ssd)
+
+    def test_total(self):
+        carro = Carro(self.request)
+        self.assertEqual(carro.precio_total(), Decimal('30.00'))
+        self.assertEqual(len(carro), 3)
+
+    def test_producto_eliminado_no_cuenta_en_el_total(self):
+        self.ssd.delete()
+        carro = Carro(self.request)
+        self.assertEqual(carro.precio_total(), Decimal('20.00'))
+        self.assertEqual(
+            [item['producto'] for item in carro], [self.ram]
+        )
+        self.assertEqual(len(carro), 2)
+        self.assertEqual(
+            self.request.session[settings.ID_SESSION_RESUMEN_CARRO],
+            {'cantidad': 2, 'total': '20.00'}
+        )
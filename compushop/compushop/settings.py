@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from celery.schedules import crontab  # No Aparece por defecto.
 from decouple import config  # No Aparece por defecto.
 import os  # No Aparece por defecto.
 from django.contrib.messages import constants as messages
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
     'pagos.apps.PagosConfig',
     'tienda.apps.TiendaConfig',
     'cupones.apps.CuponesConfig',
+    'exportaciones.apps.ExportacionesConfig',
     'rosetta',
     "django_extensions",
 ]
@@ -92,6 +94,11 @@ TEMPLATES = [
 WSGI_APPLICATION = 'compushop.wsgi.application'
 
 ID_SESSION_CARRO = 'carro' # No Aparece por defecto.
+ID_SESSION_RESUMEN_CARRO = 'carro_resumen' # No Aparece por defecto.
+
+# Paginación por cursor del catálogo (?cursor= y ?por_pagina=).
+PRODUCTOS_POR_PAGINA = 24  # No Aparece por defecto.
+PRODUCTOS_POR_PAGINA_MAX = 100  # No Aparece por defecto.
 
 
 # Database
@@ -163,19 +170,105 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'   # No Aparece por defecto.
 MEDIA_ROOT = BASE_DIR / 'media'   # No Aparece por defecto.
+# Archivos que no deben servirse bajo MEDIA_URL (exportaciones con datos
+# de clientes). Solo se descargan a través de las vistas que comprueban
+# permisos.
+PRIVADO_ROOT = BASE_DIR / 'privado'   # No Aparece por defecto.
 TIME_ZONE = 'Europe/Madrid'   # No Aparece por defecto.
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'   # No Aparece por defecto.
 
 CELERY_BROKER_URL = 'amqp://localhost'   # No Aparece por defecto.
+# El renderizado de PDF va a su propia cola para que no retrase los e-mails
+# ni otras tareas cortas. Se atiende con un worker dedicado:
+#   celery -A compushop worker -Q pdf --concurrency=2 --max-tasks-per-child=200
+CELERY_TASK_ROUTES = {   # No Aparece por defecto.
+    'ordenes.tasks.generar_factura': {'queue': 'pdf'},
+    'ordenes.tasks.generar_facturas_lote': {'queue': 'pdf'},
+}
+# Tareas periódicas (celery -A compushop beat).
+CELERY_BEAT_SCHEDULE = {   # No Aparece por defecto.
+    'snapshot-stock-diario': {
+        'task': 'tienda.tasks.tomar_snapshot_stock',
+        'schedule': crontab(hour=0, minute=15),
+    },
+    'liberar-reservas-caducadas': {
+        'task': 'ordenes.tasks.liberar_reservas_caducadas',
+        'schedule': crontab(minute='*/10'),
+    },
+    'reencolar-eventos-stripe': {
+        'task': 'pagos.tasks.reencolar_eventos_stripe',
+        'schedule': crontab(minute='*/5'),
+    },
+    'marcar-exportaciones-atascadas': {
+        'task': 'exportaciones.tasks.marcar_exportaciones_atascadas',
+        'schedule': crontab(minute='*/15'),
+    },
+}
+CELERY_TIMEZONE = TIME_ZONE   # No Aparece por defecto.
+# Minutos que se mantiene reservado el stock de una orden sin pagar.
+ORDENES_RESERVA_MINUTOS = 60   # No Aparece por defecto.
+# Filas escritas entre cada actualización del progreso de una exportación.
+EXPORTACION_INTERVALO_PROGRESO = 5000   # No Aparece por defecto.
+# Duración máxima de una exportación; pasado ese tiempo se da por fallida.
+EXPORTACION_TIEMPO_MAXIMO = 60 * 60 * 2   # No Aparece por defecto.
 
 # Stripe settings
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY')   # No Aparece por defecto.
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')   # No Aparece por defecto.
 STRIPE_API_VERSION = '2024-04-10'   # No Aparece por defecto.
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET')   # No Aparece por defecto.
+# Permite apuntar a un servidor local (manage.py servidor_stripe_falso).
+STRIPE_API_BASE = config(   # No Aparece por defecto.
+    'STRIPE_API_BASE', default='https://api.stripe.com'
+)
+# Segundos que un evento puede seguir pendiente antes de volver a encolarlo.
+STRIPE_EVENTOS_ESPERA = 60 * 5   # No Aparece por defecto.
+STRIPE_TIMEOUT = 10   # No Aparece por defecto.
+STRIPE_REINTENTOS = 2   # No Aparece por defecto.
 
 # Redis settings
 REDIS_HOST = 'localhost'   # No Aparece por defecto.
 REDIS_PORT = 6379   # No Aparece por defecto.
 REDIS_DB = 1   # No Aparece por defecto.
+RECOMENDADOR_CACHE_TTL = 60 * 5   # No Aparece por defecto.
+# Timeouts (segundos) y circuit breaker del recomendador.
+RECOMENDADOR_TIMEOUT = 0.1   # No Aparece por defecto.
+RECOMENDADOR_MAX_CONEXIONES = 50   # No Aparece por defecto.
+RECOMENDADOR_FALLOS_MAXIMOS = 5   # No Aparece por defecto.
+RECOMENDADOR_REINTENTO = 30   # No Aparece por defecto.
+# Timeout de las escrituras (compras registradas), sin prisa por responder.
+RECOMENDADOR_TIMEOUT_ESCRITURA = 10   # No Aparece por defecto.
+# Tabla de respaldo en memoria cuando Redis no responde.
+RECOMENDADOR_RESPALDO_DIAS = 90   # No Aparece por defecto.
+RECOMENDADOR_RESPALDO_TOP = 12   # No Aparece por defecto.
+RECOMENDADOR_RESPALDO_TTL = 60 * 15   # No Aparece por defecto.
+# Segundos de espera tras un refresco fallido antes de volver a intentarlo.
+RECOMENDADOR_RESPALDO_REINTENTO = 60   # No Aparece por defecto.
+
+# Caché compartida entre procesos (fragmentos del catálogo, contadores...).
+CACHES = {   # No Aparece por defecto.
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/2',
+        # Tiempos cortos: si Redis se cuelga el catálogo sigue sirviéndose
+        # desde la base de datos (ver tienda/cache.py) en lugar de esperar.
+        'OPTIONS': {
+            'socket_connect_timeout': 0.2,
+            'socket_timeout': 0.2,
+        },
+    }
+}
+CATALOGO_CACHE_TIMEOUT = 60 * 60   # No Aparece por defecto.
+# Fracción de lecturas de la caché del catálogo que actualizan los
+# contadores de aciertos y fallos.
+CATALOGO_CACHE_MUESTREO = 0.01   # No Aparece por defecto.
+# Fallos seguidos de Redis tras los que la caché del catálogo se salta
+# durante CATALOGO_CACHE_REINTENTO segundos.
+CATALOGO_CACHE_FALLOS_MAXIMOS = 3   # No Aparece por defecto.
+CATALOGO_CACHE_REINTENTO = 30   # No Aparece por defecto.
+
+# Métricas de los dashboards del personal (cuentas/utils/instantanea.py).
+# Se recalculan al cambiar el catálogo o con ajustes de stock del personal;
+# las ventas se reflejan cuando caducan, como mucho tras este tiempo.
+METRICAS_CACHE_TIMEOUT = 60 * 5   # No Aparece por defecto.
@@ -35,6 +35,7 @@ urlpatterns += i18n_patterns(
         path('pagos/', include('pagos.urls', namespace='pagos')),
         path('cupones/', include('cupones.urls', namespace='cupones')),
         path('almacen/', include('tienda.urls_almacen', namespace='almacen')),
+        path('exportaciones/', include('exportaciones.urls', namespace='exportaciones')),
         path('', include('tienda.urls', namespace='tienda')),
 )
 
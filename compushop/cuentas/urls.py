@@ -19,6 +19,7 @@ urlpatterns = [
     path('ventas/', views.panel_ventas, name='panel_ventas'),
     path('gerencia/', views.panel_gerencia, name='panel_gerencia'),
     path('<str:rol>/dashboard/', views_dashboard.dashboard_view, name='dashboard_view'),
+    path('<str:rol>/dashboard/<str:widget>/', views_dashboard.dashboard_widget, name='dashboard_widget'),
     path('gerencia/config_panel', views_dashboard.config_panel, name='config_panel'),
     path('panel/ventas/inventario', views.inventario_acceso_ventas, name='inventario_ventas'),
     path('configuracion/', views_dashboard.config_panel, name='config_panel'),
@@ -1,24 +1,33 @@
 # tienda/utils/graficos.py
 import plotly.express as px
-import plotly.io as pio
 import pandas as pd
-from plotly.offline import plot
+from django.utils.html import escape
+
+
+# Los gráficos se envían al navegador como JSON y se dibujan con la copia de
+# plotly.js de static/cuentas/js, la que trae el paquete plotly de Python
+# (plotly/package_data/plotly.min.js). Al actualizar plotly hay que copiarla
+# de nuevo.
+
+# Escapes de json_script para poder incrustar el JSON en un <script>.
+ESCAPES_JSON = {ord(">"): "\\u003E", ord("<"): "\\u003C", ord("&"): "\\u0026"}
 
 
 # ============================================================
 # 📊 GRÁFICOS PRINCIPALES
 # ============================================================
 
-def grafico_valor_stock_por_proveedor(df):
+def grafico_valor_stock_por_proveedor(proveedores):
     """
     Gráfico de barras horizontales que muestra el valor total
     del stock por proveedor.
+    proveedores: filas de metricas.agregados_por_proveedor().
     """
-    if df.empty:
-        return "<p>No hay datos de stock disponibles.</p>"
+    if not proveedores:
+        return None
 
     fig = px.bar(
-        df.groupby('proveedor', as_index=False)['valor_stock'].sum(),
+        pd.DataFrame(proveedores),
         x='valor_stock',
         y='proveedor',
         orientation='h',
@@ -30,69 +39,65 @@ def grafico_valor_stock_por_proveedor(df):
         yaxis={'categoryorder': 'total ascending'},
         template="plotly_white"
     )
-    return pio.to_html(fig, full_html=False)
+    return fig
 
 
-def grafico_precio_medio_por_proveedor(df):
+def grafico_precio_medio_por_proveedor(proveedores):
     """
     Gráfico de barras verticales con el precio medio de los
     productos por proveedor.
     """
-    if df.empty:
-        return "<p>No hay datos de precios disponibles.</p>"
+    if not proveedores:
+        return None
 
     fig = px.bar(
-        df.groupby('proveedor', as_index=False)['precio'].mean(),
+        pd.DataFrame(proveedores),
         x='proveedor',
-        y='precio',
+        y='precio_medio',
         title='Precio medio por proveedor (€)',
-        labels={'precio': 'Precio medio (€)', 'proveedor': 'Proveedor'},
+        labels={'precio_medio': 'Precio medio (€)', 'proveedor': 'Proveedor'},
         text_auto='.2f'
     )
     fig.update_layout(
         xaxis_tickangle=-45,
         template="plotly_white"
     )
-    return pio.to_html(fig, full_html=False)
+    return fig
 
 
-def grafico_distribucion_stock(df):
+def grafico_distribucion_stock(proveedores):
     """
     Gráfico de pastel (donut) con la distribución porcentual
     del stock por proveedor.
     """
-    if df.empty:
-        return "<p>No hay datos de stock disponibles.</p>"
+    if not proveedores:
+        return None
 
-    df_stock = df.groupby('proveedor', as_index=False)['stock'].sum()
     fig = px.pie(
-        df_stock,
-        values='stock',
+        pd.DataFrame(proveedores),
+        values='stock_total',
         names='proveedor',
         title='Distribución porcentual del stock por proveedor',
         hole=0.4
     )
     fig.update_traces(textinfo='percent+label')
     fig.update_layout(template="plotly_white")
-    return pio.to_html(fig, full_html=False)
+    return fig
 
 
 # ============================================================
 # 🔍 GRÁFICOS ADICIONALES DEL DASHBOARD
 # ============================================================
 
-def grafico_rendimiento_por_proveedor(df):
+def grafico_rendimiento_por_proveedor(proveedores):
     """
     Gráfico de rendimiento (stock/precio medio) por proveedor.
     """
-    if df.empty:
-        return "<p>No hay datos de rendimiento disponibles.</p>"
-
-    df['rendimiento'] = df['stock'] / df['precio'].replace(0, pd.NA)
-    data = df.groupby('proveedor', as_index=False)['rendimiento'].mean()
+    if not proveedores:
+        return None
 
     fig = px.bar(
-        data,
+        pd.DataFrame(proveedores),
         x='proveedor',
         y='rendimiento',
         title='Rendimiento por proveedor (Stock / Precio medio)',
@@ -101,21 +106,19 @@ def grafico_rendimiento_por_proveedor(df):
         color_continuous_scale='Viridis'
     )
     fig.update_layout(template="plotly_white")
-    return pio.to_html(fig, full_html=False)
+    return fig
 
 
-def grafico_rotacion_productos(df):
+def grafico_rotacion_productos(productos):
     """
     Gráfico de rotación de productos (inversa del stock).
+    productos: filas de metricas.rotacion_productos().
     """
-    if df.empty:
-        return "<p>No hay datos de rotación disponibles.</p>"
-
-    df['rotacion'] = 1 / df['stock'].replace(0, pd.NA)
-    data = df[['nombre', 'rotacion']].dropna()
+    if not productos:
+        return None
 
     fig = px.bar(
-        data,
+        pd.DataFrame(productos),
         x='nombre',
         y='rotacion',
         title='Rotación estimada de productos',
@@ -127,60 +130,48 @@ def grafico_rotacion_productos(df):
         xaxis_tickangle=45,
         template="plotly_white"
     )
-    return pio.to_html(fig, full_html=False)
+    return fig
 
 
 # ============================================================
 # ⚠️ ALERTAS DE STOCK BAJO
 # ============================================================
 
-def bloque_alertas_stock(df, umbral=5):
+def bloque_alertas_stock(alertas):
     """
-    Genera una lista HTML con productos cuyo stock está por debajo del umbral.
+    Genera una lista HTML con los productos de metricas.alertas_stock().
     """
-    if df.empty:
-        return ""
-
-    df_alertas = df[df['stock'] < umbral]
-    if df_alertas.empty:
+    if not alertas:
         return "<p>No hay productos con bajo nivel de stock.</p>"
 
     html = "<ul class='list-group'>"
-    for _, row in df_alertas.iterrows():
+    for alerta in alertas:
         html += f"<li class='list-group-item d-flex justify-content-between align-items-center'>"
-        html += f"{row['nombre']} <span class='badge bg-danger'>{int(row['stock'])}</span>"
+        html += f"{escape(alerta['nombre'])} <span class='badge bg-danger'>{int(alerta['stock'])}</span>"
         html += "</li>"
     html += "</ul>"
     return html
 
 
-def grafico_existencias_por_proveedor(df):
+def grafico_existencias_por_proveedor(proveedores):
     """
     Gráfico adaptable de existencias por proveedor.
     - Horizontal si hay más de 8 proveedores.
     - Vertical si hay pocos.
-    - Scroll automático si hay demasiados registros.
     """
 
-    if df.empty:
-        return "<p class='text-muted'>No hay datos disponibles para existencias.</p>"
-
-    columnas = [c.lower() for c in df.columns]
-    df.columns = columnas
-
-    if "proveedor" not in columnas or "stock" not in columnas:
-        return "<p class='text-danger'>El DataFrame no contiene 'proveedor' o 'stock'.</p>"
+    if not proveedores:
+        return None
 
     existencias = (
-        df.groupby("proveedor")["stock"]
-        .sum()
-        .reset_index()
+        pd.DataFrame(proveedores)[["proveedor", "stock_total"]]
+        .rename(columns={"stock_total": "stock"})
         .sort_values("stock", ascending=False)
     )
 
     total = existencias["stock"].sum()
     if total == 0:
-        return "<p class='text-warning'>No hay unidades registradas en stock actualmente.</p>"
+        return None
 
     # --- orientación automática ---
     orientation = "h" if len(existencias) > 8 else "v"
@@ -237,11 +228,32 @@ def grafico_existencias_por_proveedor(df):
         showlegend=False,
     )
 
-    # --- scroll automático dentro de la card ---
-    html_div = plot(fig, output_type="div", include_plotlyjs=True)
-    html_wrapped = (
-        "<div style='overflow-y:auto; max-height:650px; width:100%; "
-        "padding:10px; box-sizing:border-box;'>"
-        f"{html_div}</div>"
-    )
-    return html_wrapped
+    return fig
+
+
+# ============================================================
+# 📦 FIGURAS EN JSON
+# ============================================================
+
+# tipo de gráfico -> (función, clave de la instantánea de métricas).
+GRAFICOS = {
+    "valor_stock": (grafico_valor_stock_por_proveedor, "proveedores"),
+    "precios": (grafico_precio_medio_por_proveedor, "proveedores"),
+    "distribucion": (grafico_distribucion_stock, "proveedores"),
+    "rendimiento": (grafico_rendimiento_por_proveedor, "proveedores"),
+    "rotacion": (grafico_rotacion_productos, "rotacion"),
+    "existencias": (grafico_existencias_por_proveedor, "proveedores"),
+}
+
+
+def figura_json(tipo, datos):
+    """
+    JSON de la figura a partir de los datos de su parte de la instantánea,
+    apto también para incrustar en un <script>. Cadena vacía si no hay
+    datos.
+    """
+    funcion, _ = GRAFICOS[tipo]
+    fig = funcion(datos)
+    if fig is None:
+        return ""
+    return fig.to_json().translate(ESCAPES_JSON)
@@ -0,0 +1,112 @@
+# cuentas/utils/instantanea.py
+import time
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from tienda.cache import (
+    CLAVE_VERSION_INVENTARIO, circuito, con_respaldo, obtener_version,
+)
+from cuentas.utils.graficos import GRAFICOS, figura_json
+from cuentas.utils.metricas import (
+    agregados_por_proveedor,
+    alertas_stock,
+    rotacion_productos,
+)
+
+
+"""
+    Instantánea de las métricas de inventario de los dashboards.
+
+    Las métricas no dependen del usuario, así que se calculan una vez y se
+    guardan en la caché bajo la versión de inventario de tienda/cache.py,
+    que cambia al guardar un producto o proveedor y tras los ajustes de
+    stock del personal. Las reservas de los checkouts no la cambian (ver
+    stock.ajustar_lote): las ventas se reflejan al caducar la instantánea,
+    como mucho METRICAS_CACHE_TIMEOUT segundos después.
+
+    Cada parte se cachea por separado para que los widgets del dashboard,
+    que se piden en paralelo, solo esperen a los datos que usan. Si Redis
+    no responde (o el circuito de tienda/cache.py está abierto) se calculan
+    directamente, sin caché.
+"""
+
+# Si otro proceso está calculando una parte, una petición espera como mucho
+# ESPERA_MAXIMA segundos a que la guarde y después la calcula ella misma.
+ESPERA_MAXIMA = 1
+INTERVALO_ESPERA = 0.1
+# Caducidad del aviso de cálculo en curso, por si su proceso muere.
+DURACION_CALCULO = 10
+
+PARTES = {
+    "proveedores": agregados_por_proveedor,
+    "rotacion": rotacion_productos,
+}
+
+
+def version_metricas():
+    return obtener_version(CLAVE_VERSION_INVENTARIO)
+
+
+def obtener_o_calcular(nombre, calcular):
+    """
+    Devuelve el valor cacheado de nombre con la versión actual del
+    inventario. Si no existe lo calcula un solo proceso; el resto espera a
+    que aparezca en la caché. Si la caché falla se calcula sin ella.
+    """
+    return con_respaldo(
+        lambda: leer_o_calcular(
+            f"metricas:{nombre}:v{version_metricas()}", calcular
+        ),
+        calcular,
+    )
+
+
+def leer_o_calcular(clave, calcular):
+    valor = cache.get(clave)
+    if valor is not None:
+        return valor
+
+    clave_calculo = f"{clave}:calculando"
+    if not cache.add(clave_calculo, 1, timeout=DURACION_CALCULO):
+        limite = time.monotonic() + ESPERA_MAXIMA
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA)
+            valor = cache.get(clave)
+            if valor is not None:
+                return valor
+    valor = calcular()
+    try:
+        cache.set(clave, valor, settings.METRICAS_CACHE_TIMEOUT)
+        cache.delete(clave_calculo)
+    except RedisError:
+        # El valor ya está calculado: se devuelve aunque no se guarde.
+        circuito.registrar_fallo()
+    return valor
+
+
+def parte_instantanea(parte):
+    return obtener_o_calcular(parte, PARTES[parte])
+
+
+def alertas_instantanea(umbral):
+    """
+    Productos con stock por debajo del umbral: metricas.alertas_stock(umbral)
+    cacheada con la versión del inventario. Cada umbral tiene su propia
+    entrada.
+    """
+    return obtener_o_calcular(
+        f"alertas:{umbral}", lambda: alertas_stock(umbral)
+    )
+
+
+def grafico_json(tipo):
+    """
+    JSON de la figura del gráfico tipo (cadena vacía si no hay datos). Se
+    guarda en la caché con la versión del inventario, así que solo se
+    construye cuando cambian los datos.
+    """
+    _, parte = GRAFICOS[tipo]
+    return obtener_o_calcular(
+        f"grafico:{tipo}",
+        lambda: figura_json(tipo, parte_instantanea(parte)),
+    )
@@ -1,80 +1,12 @@
 # tienda/utils/metricas.py
-import pandas as pd
+from django.db.models import (
+    Avg, Case, Count, F, FloatField, Q, Sum, When,
+)
+from django.db.models.functions import Cast
 from tienda.models import Producto
 from cuentas.models import ConfiguracionUsuario
 
 
-def obtener_dataframe_productos():
-    """
-    Convierte los productos de la base de datos en un DataFrame con columnas limpias.
-    Incluye proveedor y stock, y calcula el valor del stock.
-    """
-    productos = Producto.objects.select_related("proveedor").values(
-        "id",
-        "nombre",
-        "proveedor__nombre_empresa",  # campo real del proveedor
-        "precio",
-        "stock",
-        "stock_minimo",
-        "disponible",
-    )
-
-    df = pd.DataFrame(list(productos))
-
-    if df.empty:
-        return df
-
-    # Renombrar proveedor
-    df = df.rename(columns={"proveedor__nombre_empresa": "proveedor"})
-
-    # Calcular valor de stock dinámicamente
-    df["precio"] = pd.to_numeric(df["precio"], errors="coerce").fillna(0)
-    df["stock"] = pd.to_numeric(df["stock"], errors="coerce").fillna(0)
-    df["valor_stock"] = df["precio"] * df["stock"]
-
-    return df
-
-
-def calcular_metricas(df):
-    """
-    Calcula métricas generales y por proveedor.
-    """
-    # Asegurar tipos numéricos antes de operar
-    for col in ['precio', 'stock', 'stock_minimo', 'valor_stock']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-    metricas = {}
-
-    # Valor total del stock global
-    metricas['valor_total_stock'] = round(df['valor_stock'].sum(), 2)
-
-    # Promedio de precio y stock por proveedor
-    metricas['precio_promedio_por_proveedor'] = (
-        df.groupby('proveedor', dropna=False)['precio'].mean().round(2).to_dict()
-    )
-    metricas['stock_total_por_proveedor'] = (
-        df.groupby('proveedor', dropna=False)['stock'].sum().to_dict()
-    )
-    metricas['valor_stock_por_proveedor'] = (
-        df.groupby('proveedor', dropna=False)['valor_stock'].sum().round(2).to_dict()
-    )
-
-    # Número de productos por proveedor
-    metricas['num_productos_por_proveedor'] = (
-        df.groupby('proveedor', dropna=False)['nombre'].count().to_dict()
-    )
-
-    # Productos bajo stock mínimo
-    metricas['productos_bajo_stock_minimo'] = int((df['stock'] <= df['stock_minimo']).sum())
-
-    # Stock total y precio promedio global
-    metricas['stock_total_global'] = int(df['stock'].sum())
-    metricas['precio_medio_global'] = round(df['precio'].mean(), 2)
-
-    return metricas
-
-
 def obtener_metricas_activas(usuario):
     """
     Retorna un diccionario con las métricas activas para el usuario.
@@ -126,58 +58,94 @@ def obtener_metricas_activas(usuario):
 
 
 # ============================================================
-# MÉTRICAS INDIVIDUALES PARA LOS GRÁFICOS DEL DASHBOARD
+# AGREGADOS CALCULADOS EN LA BASE DE DATOS
 # ============================================================
 
-import pandas as pd
+# Máximo de productos en los gráficos por producto.
+MAX_PRODUCTOS_GRAFICO = 50
+
+
+def expresiones_agregados():
+    """
+    Agregados de las métricas por proveedor.
+    El rendimiento es la media de stock/precio de cada producto; los
+    productos con precio 0 quedan fuera (NULL no cuenta en AVG).
+    """
+    return {
+        "valor_stock": Sum(
+            F("precio") * F("stock"), output_field=FloatField()
+        ),
+        "precio_medio": Avg(Cast("precio", FloatField())),
+        "stock_total": Sum("stock"),
+        "num_productos": Count("id"),
+        "bajo_minimo": Count("id", filter=Q(stock__lte=F("stock_minimo"))),
+        "rendimiento": Avg(Case(
+            When(
+                ~Q(precio=0),
+                then=Cast("stock", FloatField())
+                / Cast("precio", FloatField()),
+            ),
+            default=None,
+            output_field=FloatField(),
+        )),
+    }
 
 
-def metricas_valor_stock(df):
-    """
-    Valor total del stock por proveedor (para gráfico de barras).
-    """
-    if df.empty:
-        return pd.DataFrame(columns=["proveedor", "valor_stock"])
-    return df.groupby("proveedor", as_index=False)["valor_stock"].sum()
+def redondear(fila):
+    for clave in ("valor_stock", "precio_medio", "rendimiento"):
+        if fila[clave] is not None:
+            fila[clave] = round(fila[clave], 2)
+    fila["valor_stock"] = fila["valor_stock"] or 0
+    fila["stock_total"] = fila["stock_total"] or 0
+    return fila
 
 
-def metricas_precio_medio(df):
+def agregados_por_proveedor():
     """
-    Precio medio por proveedor (para gráfico de líneas).
+    Métricas de cada proveedor con una única consulta GROUP BY. El coste
+    depende del número de proveedores, no del de productos.
+    Devuelve una lista de dicts con las claves proveedor, valor_stock,
+    precio_medio, stock_total, num_productos, bajo_minimo y rendimiento.
     """
-    if df.empty:
-        return pd.DataFrame(columns=["proveedor", "precio_medio"])
-    return df.groupby("proveedor", as_index=False)["precio"].mean().rename(
-        columns={"precio": "precio_medio"}
+    filas = (
+        Producto.objects.order_by()
+        .values("proveedor__nombre_empresa")
+        .annotate(**expresiones_agregados())
+        .order_by("proveedor__nombre_empresa")
     )
+    return [
+        redondear({"proveedor": fila.pop("proveedor__nombre_empresa"), **fila})
+        for fila in filas
+    ]
 
 
-def metricas_rendimiento_proveedor(df):
-    """
-    Rendimiento: ratio stock/precio medio por proveedor.
-    """
-    if df.empty:
-        return pd.DataFrame(columns=["proveedor", "rendimiento"])
-    df["rendimiento"] = df["stock"] / df["precio"].replace(0, pd.NA)
-    return df.groupby("proveedor", as_index=False)["rendimiento"].mean()
-
-
-def metricas_rotacion_productos(df):
+def rotacion_productos(limite=MAX_PRODUCTOS_GRAFICO):
     """
-    Rotación estimada (inversa del stock).
+    Rotación estimada (1/stock) de los productos con menos existencias.
+    Los productos sin stock no tienen rotación.
     """
-    if df.empty:
-        return pd.DataFrame(columns=["nombre", "rotacion"])
-    df["rotacion"] = 1 / df["stock"].replace(0, pd.NA)
-    return df[["nombre", "rotacion"]].dropna()
+    filas = (
+        Producto.objects.filter(stock__gt=0)
+        .order_by("stock", "nombre")
+        .values_list("nombre", "stock")[:limite]
+    )
+    return [
+        {"nombre": nombre, "rotacion": 1 / stock} for nombre, stock in filas
+    ]
 
 
-def metricas_alertas_stock(df, umbral=None):
+def alertas_stock(umbral=None):
     """
-    Devuelve productos con stock por debajo del mínimo o de un umbral.
+    Productos con stock por debajo del umbral (o de su stock mínimo si no
+    se indica), de menor a mayor stock. Sin límite: las alertas no son un
+    gráfico y deben aparecer todas.
     """
-    if df.empty:
-        return pd.DataFrame(columns=["nombre", "stock"])
+    productos = Producto.objects.all()
     if umbral is not None:
-        return df[df["stock"] < umbral][["nombre", "stock"]]
-    return df[df["stock"] < df["stock_minimo"]][["nombre", "stock"]]
+        productos = productos.filter(stock__lt=umbral)
+    else:
+        productos = productos.filter(stock__lt=F("stock_minimo"))
+    filas = productos.order_by("stock", "nombre").values_list("nombre", "stock")
+    return [
+        {"nombre": nombre, "stock": stock} for nombre, stock in filas
+    ]
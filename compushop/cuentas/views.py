@@ -58,17 +58,8 @@ def panel_ventas(request):
     Muestra un resumen básico y una métrica por defecto (redimiento
     por proveedor.)
     """
-    from cuentas.utils.metricas import obtener_dataframe_productos
-    from cuentas.utils.graficos import grafico_rendimiento_por_proveedor
-
-    df = obtener_dataframe_productos()
-    grafico_html = grafico_rendimiento_por_proveedor(df)
-
-    context = {
-        'grafico_html': grafico_html,
-    }
-
-    return render(request, 'cuentas/ventas.html', context)
+    # El gráfico se pide al widget del dashboard desde el navegador.
+    return render(request, 'cuentas/ventas.html')
 
 
 @login_required
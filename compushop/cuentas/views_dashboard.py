@@ -1,31 +1,57 @@
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+)
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from cuentas.decorators import solo_rol
-from cuentas.utils.metricas import (
-    obtener_dataframe_productos,
-    obtener_metricas_activas,
-)
-from cuentas.utils.graficos import (
-    grafico_valor_stock_por_proveedor,
-    grafico_precio_medio_por_proveedor,
-    grafico_distribucion_stock,
-    grafico_rendimiento_por_proveedor,
-    grafico_existencias_por_proveedor,
-    grafico_rotacion_productos,
-    bloque_alertas_stock,
-)
+from cuentas.decorators import solo_personal, solo_rol
+from cuentas.utils.graficos import bloque_alertas_stock
+from cuentas.utils.instantanea import alertas_instantanea, grafico_json
+from cuentas.utils.metricas import obtener_metricas_activas
 from .forms import ConfiguracionUsuarioForm
 from .models import ConfiguracionUsuario
 from django.utils.translation import gettext_lazy as _
 
 
 
+# widget -> (métrica que lo activa, título, color de la cabecera).
+WIDGETS_DASHBOARD = {
+    "valor_stock": ("valor_stock", "Valor total de stock por proveedor", "bg-primary"),
+    "precios": ("precio_medio", "Precio medio por proveedor", "bg-success"),
+    "distribucion": ("distribucion_stock", "Distribución del stock", "bg-info"),
+    "rendimiento": ("rendimiento", "Rendimiento por proveedor", "bg-info"),
+    "rotacion": ("rotacion", "Rotación estimada de productos", "bg-secondary"),
+    "alertas": ("alertas_stock", "Productos con stock bajo", "bg-danger"),
+}
+
+# Widgets de cada dashboard, en orden de aparición.
+DASHBOARDS = {
+    "ventas": (
+        "Dashboard de Ventas",
+        ["rendimiento", "precios", "distribucion", "alertas"],
+    ),
+    "gerencia": (
+        "Dashboard de Gerencia",
+        ["valor_stock", "precios", "distribucion", "rendimiento", "rotacion",
+         "alertas"],
+    ),
+}
+
+# Roles del personal que pueden pedir los widgets de cada dashboard. Gerencia
+# también entra al panel de ventas (ver views.panel_ventas).
+ROLES_DASHBOARD = {
+    "ventas": ("ventas", "gerencia"),
+    "gerencia": ("gerencia",),
+}
+
+
 @login_required
 def dashboard_view(request, rol):
     """
     Vista genérica de dashboard para roles: gerencia, ventas y almacén.
     Se diferencia según el parámetro <rol> recibido en la URL.
+    Solo devuelve la estructura de la página: cada widget se pide a
+    dashboard_widget en paralelo desde el navegador y se dibuja al llegar.
     """
     user = request.user
 
@@ -33,41 +59,56 @@ def dashboard_view(request, rol):
     if rol == "almacen":
         return redirect('cuentas:panel_almacen')
 
-    df = obtener_dataframe_productos()
+    if rol not in DASHBOARDS:
+        # En caso de rol inválido
+        return redirect('cuentas:panel_personal')
 
     metricas = obtener_metricas_activas(user)
+    titulo, widgets = DASHBOARDS[rol]
 
     context = {
         "usuario": user,
         "rol": rol,
         "metricas": metricas,
+        "titulo_dashboard": titulo,
+        "widgets": [
+            {
+                "widget": widget,
+                "titulo": WIDGETS_DASHBOARD[widget][1],
+                "color": WIDGETS_DASHBOARD[widget][2],
+            }
+            for widget in widgets
+            if metricas.get(WIDGETS_DASHBOARD[widget][0])
+        ],
     }
+    return render(request, "cuentas/dashboard_metricas.html", context)
 
-    # Configuración de los dashboard para roles ventas y gerencia.
-    if rol == "ventas":
-        context.update({
-            "titulo_dashboard": "Dashboard de Ventas",
-            "grafico_rendimiento_html": grafico_rendimiento_por_proveedor(df) if metricas.get("rendimiento") else "",
-            # OJO: el template suele esperar “grafico_precios_html”
-            "grafico_precios_html": grafico_precio_medio_por_proveedor(df) if metricas.get("precio_medio") else "",
-            "grafico_distribucion_stock_html": grafico_distribucion_stock(df) if metricas.get("distribucion_stock") else "",
-        })
-
-    elif rol == "gerencia":
-        context.update({
-            "titulo_dashboard": "Dashboard de Gerencia",
-            "grafico_valor_stock_html": grafico_valor_stock_por_proveedor(df) if metricas.get("valor_stock") else "",
-            "grafico_precios_html": grafico_precio_medio_por_proveedor(df) if metricas.get("precio_medio") else "",
-            "grafico_distribucion_stock_html": grafico_distribucion_stock(df) if metricas.get("distribucion_stock") else "",
-            "grafico_rendimiento_html": grafico_rendimiento_por_proveedor(df) if metricas.get("rendimiento") else "",
-            "grafico_rotacion_html": grafico_rotacion_productos(df) if metricas.get("rotacion") else "",            
-        })
-
-    else:
-        # En caso de rol inválido
-        return redirect('cuentas:panel_personal')
 
-    return render(request, "cuentas/dashboard_metricas.html", context)
+@login_required
+@solo_personal
+def dashboard_widget(request, rol, widget):
+    """
+    Datos de un widget del dashboard en JSON: {"figura": <figura Plotly>}
+    para los gráficos o {"html": ...} para las alertas de stock.
+    Cada widget usa solo su parte de la instantánea de métricas, así que
+    uno lento no retrasa a los demás.
+    """
+    if rol not in DASHBOARDS or widget not in DASHBOARDS[rol][1]:
+        raise Http404
+    if request.user.rol_personal not in ROLES_DASHBOARD[rol]:
+        return HttpResponseForbidden()
+
+    if widget == "alertas":
+        umbral = obtener_metricas_activas(request.user).get("umbral_stock", 5)
+        alertas = alertas_instantanea(int(umbral))
+        return JsonResponse({"html": bloque_alertas_stock(alertas)})
+
+    # La figura ya está serializada en la caché: se incrusta sin volver a
+    # decodificarla.
+    figura = grafico_json(widget) or "null"
+    return HttpResponse(
+        '{"figura": %s}' % figura, content_type="application/json"
+    )
 
 
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cupon
+from .models import Cupon, CuponStripe
 
 # Register your models here.
 
@@ -14,3 +14,9 @@ class CuponAdmin(admin.ModelAdmin):
     ]
     list_filter = ['activo', 'valido_desde', 'valido_hasta']
     search_fields = ['code']
+
+
+@admin.register(CuponStripe)
+class CuponStripeAdmin(admin.ModelAdmin):
+    list_display = ['id_stripe', 'cupon', 'descuento', 'creado']
+    raw_id_fields = ['cupon']
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cupones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuponStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descuento', models.IntegerField()),
+                ('id_stripe', models.CharField(max_length=255, unique=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('cupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cupones_stripe', to='cupones.cupon')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cupon', 'descuento'), name='cupon_stripe_unico')],
+            },
+        ),
+    ]
@@ -15,3 +15,27 @@ class Cupon(models.Model):
     activo = models.BooleanField()
     def __str__(self):
         return self.codigo
+
+
+class CuponStripe(models.Model):
+    '''
+        Cupón creado en Stripe para un Cupon y un porcentaje de descuento.
+        Se crea la primera vez que se usa (ver pasarela.py) y se reutiliza
+        en los siguientes pagos en lugar de crear uno nuevo cada vez.
+    '''
+    cupon = models.ForeignKey(
+        Cupon, related_name='cupones_stripe', on_delete=models.CASCADE
+    )
+    descuento = models.IntegerField()
+    id_stripe = models.CharField(max_length=255, unique=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cupon', 'descuento'], name='cupon_stripe_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return self.id_stripe
@@ -0,0 +1,34 @@
+import stripe
+from .models import CuponStripe
+
+
+def id_cupon_stripe(cupon, descuento):
+    '''
+        Id del cupón de Stripe equivalente a cupon con el porcentaje
+        descuento. Se busca en CuponStripe (una consulta por índice, sin
+        depender de Redis en el pago); solo la primera vez se llama a la API
+        de Stripe para crearlo.
+
+        El id es determinista, así que si dos pagos lo crean a la vez o ya
+        existía en Stripe (p. ej. tras vaciar la tabla) se reutiliza.
+    '''
+    mapeo = CuponStripe.objects.filter(
+        cupon=cupon, descuento=descuento
+    ).first()
+    if mapeo is None:
+        id_stripe = f'compushop_{cupon.id}_{descuento}'
+        try:
+            stripe.Coupon.create(
+                id=id_stripe,
+                name=cupon.codigo,
+                percent_off=descuento,
+                duration='once'
+            )
+        except stripe.error.InvalidRequestError as e:
+            if e.code != 'resource_already_exists':
+                raise
+        mapeo, _ = CuponStripe.objects.get_or_create(
+            cupon=cupon, descuento=descuento,
+            defaults={'id_stripe': id_stripe}
+        )
+    return mapeo.id_stripe
@@ -0,0 +1,22 @@
+from django.contrib import admin
+from .models import TrabajoExportacion
+
+# Register your models here.
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'tipo',
+        'estado',
+        'procesadas',
+        'total',
+        'usuario',
+        'creado',
+        'finalizado'
+    ]
+    list_filter = ['tipo', 'estado', 'creado']
+    raw_id_fields = ['usuario']
+    readonly_fields = [
+        'estado', 'total', 'procesadas', 'archivo', 'error', 'finalizado'
+    ]
@@ -0,0 +1,24 @@
+from django import forms
+from .registro import tipos_para_rol
+
+
+class SolicitudExportacionForm(forms.Form):
+    tipo = forms.ChoiceField(choices=[])
+    desde = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    hasta = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
+    def __init__(self, *args, rol=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Cada rol solo puede exportar los informes de su área.
+        self.fields['tipo'].choices = tipos_para_rol(rol)
+
+    def filtros(self):
+        return {
+            campo: self.cleaned_data[campo].isoformat()
+            for campo in ('desde', 'hasta')
+            if self.cleaned_data.get(campo)
+        }
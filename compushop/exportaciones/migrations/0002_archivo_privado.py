@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:33
+
+import exportaciones.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exportaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajoexportacion',
+            name='archivo',
+            field=models.FileField(blank=True, storage=exportaciones.models.almacenamiento_privado, upload_to='exportaciones/'),
+        ),
+    ]
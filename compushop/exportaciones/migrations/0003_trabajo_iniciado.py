@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exportaciones', '0002_archivo_privado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoexportacion',
+            name='iniciado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from .registro import TIPOS
+
+# Create your models here.
+
+
+def almacenamiento_privado():
+    # Fuera de MEDIA_ROOT y sin URL pública: los CSV solo se sirven desde
+    # views.descargar_exportacion.
+    return FileSystemStorage(location=settings.PRIVADO_ROOT, base_url=None)
+
+
+class TrabajoExportacion(models.Model):
+    '''
+        Exportación de un informe ejecutada por Celery (ver tasks.py).
+        El worker actualiza procesadas cada cierto número de filas para
+        poder mostrar el progreso mientras se genera el archivo.
+    '''
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    filtros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=10, choices=ESTADOS, default='pendiente'
+    )
+    total = models.PositiveIntegerField(default=0)
+    procesadas = models.PositiveIntegerField(default=0)
+    archivo = models.FileField(
+        upload_to='exportaciones/', storage=almacenamiento_privado, blank=True
+    )
+    error = models.TextField(blank=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='exportaciones'
+    )
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-creado']
+        indexes = [
+            models.Index(fields=['usuario', '-creado']),
+        ]
+        verbose_name = 'Exportación'
+        verbose_name_plural = 'Exportaciones'
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} #{self.id}'
+
+    @property
+    def progreso(self):
+        if self.estado == 'completado':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, int(self.procesadas * 100 / self.total))
@@ -0,0 +1,44 @@
+from django.utils.module_loading import import_string
+
+
+'''
+    Informes que pueden exportarse en segundo plano.
+
+    Cada exportador es una función que recibe el dict de filtros del trabajo
+    y devuelve una tupla (cabecera, total, filas), donde filas es un
+    generador que lee la base de datos por bloques. Se indican por su ruta
+    para no importar los modelos de otras apps al cargar este módulo.
+
+    tipo -> (nombre, ruta del exportador, roles del personal que lo usan)
+'''
+
+EXPORTADORES = {
+    'ordenes': (
+        'Órdenes',
+        'ordenes.exportacion.exportador_ordenes',
+        ('ventas', 'gerencia'),
+    ),
+    'movimientos': (
+        'Movimientos de stock',
+        'tienda.exportacion.exportador_movimientos',
+        ('almacen', 'gerencia'),
+    ),
+    'inventario': (
+        'Inventario',
+        'tienda.exportacion.exportador_inventario',
+        ('almacen', 'gerencia'),
+    ),
+}
+
+TIPOS = [(tipo, datos[0]) for tipo, datos in EXPORTADORES.items()]
+
+
+def tipos_para_rol(rol):
+    return [
+        (tipo, datos[0]) for tipo, datos in EXPORTADORES.items()
+        if rol in datos[2]
+    ]
+
+
+def obtener_exportador(tipo):
+    return import_string(EXPORTADORES[tipo][1])
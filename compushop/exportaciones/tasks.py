@@ -0,0 +1,88 @@
+import csv
+import io
+import secrets
+import tempfile
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from .models import TrabajoExportacion
+from .registro import obtener_exportador
+
+
+@shared_task(
+    name='exportaciones.tasks.ejecutar_exportacion',
+    time_limit=settings.EXPORTACION_TIEMPO_MAXIMO
+)
+def ejecutar_exportacion(id_trabajo):
+    '''
+        Genera el CSV de un trabajo de exportación escribiendo las filas a
+        un archivo temporal a medida que se leen, por lo que el tamaño del
+        informe no afecta a la memoria del worker. Al terminar se guarda en
+        el almacenamiento privado del campo archivo con un nombre aleatorio.
+    '''
+    # Solo un worker puede pasar el trabajo de pendiente a en curso; si la
+    # tarea se entrega dos veces la segunda no hace nada.
+    tomado = TrabajoExportacion.objects.filter(
+        id=id_trabajo, estado='pendiente'
+    ).update(estado='en_curso', iniciado=timezone.now())
+    if not tomado:
+        return
+    trabajo = TrabajoExportacion.objects.get(id=id_trabajo)
+    nombre = (
+        f'{trabajo.tipo}_{trabajo.id}_{secrets.token_urlsafe(16)}.csv'
+    )
+    intervalo = settings.EXPORTACION_INTERVALO_PROGRESO
+    try:
+        cabecera, total, filas = obtener_exportador(trabajo.tipo)(
+            trabajo.filtros
+        )
+        TrabajoExportacion.objects.filter(id=trabajo.id).update(total=total)
+        procesadas = 0
+        with tempfile.TemporaryFile() as temporal:
+            texto = io.TextIOWrapper(temporal, encoding='utf-8', newline='')
+            escritor = csv.writer(texto)
+            escritor.writerow(cabecera)
+            for fila in filas:
+                escritor.writerow(fila)
+                procesadas += 1
+                if procesadas % intervalo == 0:
+                    TrabajoExportacion.objects.filter(id=trabajo.id).update(
+                        procesadas=procesadas
+                    )
+            texto.flush()
+            texto.detach()
+            temporal.seek(0)
+            trabajo.archivo.save(nombre, File(temporal), save=False)
+    except Exception as e:
+        TrabajoExportacion.objects.filter(id=trabajo.id).update(
+            estado='error', error=str(e), finalizado=timezone.now()
+        )
+        raise
+    TrabajoExportacion.objects.filter(id=trabajo.id).update(
+        estado='completado',
+        archivo=trabajo.archivo.name,
+        procesadas=procesadas,
+        total=max(total, procesadas),
+        finalizado=timezone.now()
+    )
+
+
+@shared_task(name='exportaciones.tasks.marcar_exportaciones_atascadas')
+def marcar_exportaciones_atascadas():
+    '''
+        Marca como error los trabajos que llevan en curso más de
+        EXPORTACION_TIEMPO_MAXIMO segundos (el límite de la tarea): su
+        worker murió o se cortó sin poder actualizarlos. Devuelve cuántos.
+    '''
+    limite = timezone.now() - timedelta(
+        seconds=settings.EXPORTACION_TIEMPO_MAXIMO
+    )
+    return TrabajoExportacion.objects.filter(
+        estado='en_curso', iniciado__lt=limite
+    ).update(
+        estado='error',
+        error='La exportación no terminó a tiempo.',
+        finalizado=timezone.now()
+    )
@@ -0,0 +1,148 @@
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from ordenes.models import Orden
+from .models import TrabajoExportacion
+from .tasks import ejecutar_exportacion, marcar_exportaciones_atascadas
+
+
+def crear_usuario(username, tipo_cuenta='personal', rol_personal=None):
+    return get_user_model().objects.create_user(
+        username=username,
+        password='clave-de-prueba',
+        tipo_cuenta=tipo_cuenta,
+        rol_personal=rol_personal
+    )
+
+
+@mock.patch('exportaciones.views.ejecutar_exportacion.delay')
+class ExportacionesTests(TestCase):
+    def setUp(self):
+        self.ventas = crear_usuario('ventas', rol_personal='ventas')
+        self.orden = Orden.objects.create(
+            nombre='Ana',
+            primer_apellido='García',
+            email='ana@example.com',
+            direccion='Calle Mayor 1',
+            codigo_postal='28001',
+            poblacion='Madrid'
+        )
+
+    def solicitar(self, usuario, tipo='ordenes'):
+        self.client.force_login(usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('exportaciones:lista'), {'tipo': tipo}
+            )
+
+    def ejecutar(self, trabajo):
+        ejecutar_exportacion(trabajo.id)
+        trabajo.refresh_from_db()
+        if trabajo.archivo:
+            self.addCleanup(trabajo.archivo.delete, save=False)
+        return trabajo
+
+    def test_crear_ejecutar_y_descargar(self, delay):
+        respuesta = self.solicitar(self.ventas)
+        self.assertRedirects(
+            respuesta, reverse('exportaciones:lista'),
+            fetch_redirect_response=False
+        )
+        trabajo = TrabajoExportacion.objects.get()
+        self.assertEqual(
+            (trabajo.tipo, trabajo.usuario, trabajo.estado),
+            ('ordenes', self.ventas, 'pendiente')
+        )
+        delay.assert_called_once_with(trabajo.id)
+
+        trabajo = self.ejecutar(trabajo)
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual((trabajo.total, trabajo.procesadas), (1, 1))
+        self.assertIsNotNone(trabajo.iniciado)
+
+        estado = self.client.get(
+            reverse('exportaciones:estado', args=[trabajo.id])
+        ).json()
+        self.assertEqual((estado['estado'], estado['progreso']), ('completado', 100))
+
+        respuesta = self.client.get(
+            reverse('exportaciones:descargar', args=[trabajo.id])
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = b''.join(respuesta.streaming_content).decode()
+        lineas = contenido.splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('ana@example.com', lineas[1])
+
+    def test_archivo_fuera_de_media(self, delay):
+        self.solicitar(self.ventas)
+        trabajo = self.ejecutar(TrabajoExportacion.objects.get())
+        ruta = Path(trabajo.archivo.path)
+        self.assertTrue(ruta.is_relative_to(settings.PRIVADO_ROOT))
+        self.assertFalse(ruta.is_relative_to(settings.MEDIA_ROOT))
+
+    def test_segunda_entrega_no_repite_el_trabajo(self, delay):
+        self.solicitar(self.ventas)
+        trabajo = self.ejecutar(TrabajoExportacion.objects.get())
+        ejecutar_exportacion(trabajo.id)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual(trabajo.procesadas, 1)
+
+    def test_tipo_no_permitido_para_el_rol(self, delay):
+        almacen = crear_usuario('almacen', rol_personal='almacen')
+        respuesta = self.solicitar(almacen, tipo='ordenes')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(TrabajoExportacion.objects.exists())
+        delay.assert_not_called()
+
+    def test_solo_el_autor_y_gerencia_ven_el_trabajo(self, delay):
+        self.solicitar(self.ventas)
+        trabajo = self.ejecutar(TrabajoExportacion.objects.get())
+        urls = [
+            reverse('exportaciones:estado', args=[trabajo.id]),
+            reverse('exportaciones:descargar', args=[trabajo.id]),
+        ]
+        otro = crear_usuario('ventas2', rol_personal='ventas')
+        self.client.force_login(otro)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        gerencia = crear_usuario('gerencia', rol_personal='gerencia')
+        self.client.force_login(gerencia)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_clientes_no_acceden(self, delay):
+        self.solicitar(self.ventas)
+        trabajo = TrabajoExportacion.objects.get()
+        cliente = crear_usuario('cliente', tipo_cuenta='cliente')
+        self.client.force_login(cliente)
+        respuesta = self.client.get(
+            reverse('exportaciones:descargar', args=[trabajo.id])
+        )
+        self.assertRedirects(
+            respuesta, reverse('cuentas:login'), fetch_redirect_response=False
+        )
+
+    def test_marcar_exportaciones_atascadas(self, delay):
+        ahora = timezone.now()
+        atascado = TrabajoExportacion.objects.create(
+            tipo='ordenes', estado='en_curso',
+            iniciado=ahora - timedelta(hours=3)
+        )
+        reciente = TrabajoExportacion.objects.create(
+            tipo='ordenes', estado='en_curso',
+            iniciado=ahora - timedelta(minutes=5)
+        )
+        self.assertEqual(marcar_exportaciones_atascadas(), 1)
+        atascado.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual(atascado.estado, 'error')
+        self.assertIsNotNone(atascado.finalizado)
+        self.assertEqual(reciente.estado, 'en_curso')
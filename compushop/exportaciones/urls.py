@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'exportaciones'
+
+urlpatterns = [
+    path('', views.lista_exportaciones, name='lista'),
+    path('<int:id>/estado/', views.estado_exportacion, name='estado'),
+    path('<int:id>/descargar/', views.descargar_exportacion, name='descargar'),
+]
@@ -0,0 +1,81 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from cuentas.decorators import solo_personal
+from .forms import SolicitudExportacionForm
+from .models import TrabajoExportacion
+from .tasks import ejecutar_exportacion
+
+# Create your views here.
+
+
+def trabajos_visibles(usuario):
+    # Gerencia ve todas las exportaciones; el resto solo las suyas.
+    trabajos = TrabajoExportacion.objects.select_related('usuario')
+    if usuario.rol_personal != 'gerencia':
+        trabajos = trabajos.filter(usuario=usuario)
+    return trabajos
+
+
+@login_required
+@solo_personal
+def lista_exportaciones(request):
+    if request.method == 'POST':
+        form = SolicitudExportacionForm(
+            request.POST, rol=request.user.rol_personal
+        )
+        if form.is_valid():
+            trabajo = TrabajoExportacion.objects.create(
+                tipo=form.cleaned_data['tipo'],
+                filtros=form.filtros(),
+                usuario=request.user
+            )
+            # Se encola al confirmar la transacción para que el worker
+            # encuentre el trabajo ya guardado.
+            transaction.on_commit(
+                lambda: ejecutar_exportacion.delay(trabajo.id)
+            )
+            messages.success(
+                request,
+                'Exportación en curso. Podrás descargarla desde esta página.'
+            )
+            return redirect('exportaciones:lista')
+    else:
+        form = SolicitudExportacionForm(rol=request.user.rol_personal)
+    trabajos = trabajos_visibles(request.user)[:50]
+    return render(
+        request,
+        'exportaciones/lista.html',
+        {'form': form, 'trabajos': trabajos}
+    )
+
+
+@login_required
+@solo_personal
+def estado_exportacion(request, id):
+    trabajo = get_object_or_404(trabajos_visibles(request.user), id=id)
+    return JsonResponse({
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'procesadas': trabajo.procesadas,
+        'total': trabajo.total,
+    })
+
+
+@login_required
+@solo_personal
+def descargar_exportacion(request, id):
+    trabajo = get_object_or_404(
+        trabajos_visibles(request.user), id=id, estado='completado'
+    )
+    try:
+        archivo = trabajo.archivo.open('rb')
+    except FileNotFoundError:
+        raise Http404('El archivo de la exportación ya no existe.')
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f'{trabajo.tipo}_{trabajo.id}.csv'
+    )
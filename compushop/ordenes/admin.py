@@ -1,9 +1,10 @@
 from django.contrib import admin
 from .models import Orden, ItemOrden
 from django.utils.safestring import mark_safe
-import csv
-import datetime
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from .exportacion import exportar_ordenes_csv
+from .facturas import zip_facturas
+from .tasks import generar_facturas_lote
 from django.urls import reverse
 '''
     Se desaconseja usar mark_safe en la entrada del usuario para evitar ataques
@@ -35,37 +36,52 @@ def exportar_a_csv(modeladmin, request, queryset):
     disposicion_contenido = (
         f'attachment; filename={opciones.verbose_name}.csv'
     )
-    # Creamos una instancia de HttpResponse, especificando text/csv en el
-    # content type, para decirle al browser que la respuesta tiene que ser
-    # tratada como un archivo CSV.
-    respuesta = HttpResponse(content_type='text/csv; charset=utf-8')
+    # StreamingHttpResponse envía el CSV fila a fila a medida que se genera
+    # (ver exportacion.py), así que la memoria usada no depende del número
+    # de órdenes y el worker no espera a tener el archivo completo.
+    respuesta = StreamingHttpResponse(
+        exportar_ordenes_csv(queryset),
+        content_type='text/csv; charset=utf-8'
+    )
     respuesta['Content-Disposition'] = disposicion_contenido
-    # Creamos un objeto writer para escribir al objeto respuesta
-    escritor = csv.writer(respuesta)
-    campos = [
-        campo
-        for campo in opciones.get_fields()
-        if not campo.many_to_many and not campo.one_to_many
-    ]
-    # Escribir el encabezado en la primer línea.
-    escritor.writerow([campo.verbose_name for campo in campos])
-    # Iteramos el queryset recibido
-    for obj in queryset:
-        datos_fila = []
-        for campo in campos:
-            # Obtenemos el valor de cada campo con getattr
-            valor = getattr(obj, campo.name)
-            # Si hay un objeto datetime debemos pasarlo a string para el CSV
-            if isinstance(valor, datetime.datetime):
-                valor = valor.strftime('%d/%m/%Y')
-            datos_fila.append(valor)
-        escritor.writerow(datos_fila)
     return respuesta
 
 # Customizamos el nombre de la acción en el drop-down del admin
 exportar_a_csv.short_description = 'Exportar a CSV'
 
 
+def zip_y_encolar_pendientes(ordenes):
+    # Al terminar el ZIP se encolan en la cola 'pdf' las facturas que
+    # faltaban; la web nunca renderiza PDF.
+    pendientes = []
+    yield from zip_facturas(ordenes, pendientes=pendientes)
+    if pendientes:
+        generar_facturas_lote.delay(pendientes)
+
+
+def descargar_facturas(modeladmin, request, queryset):
+    # El ZIP se envía por partes a medida que se añade cada factura.
+    respuesta = StreamingHttpResponse(
+        zip_y_encolar_pendientes(queryset.order_by('id')),
+        content_type='application/zip'
+    )
+    respuesta['Content-Disposition'] = 'attachment; filename=facturas.zip'
+    return respuesta
+
+descargar_facturas.short_description = 'Descargar facturas (ZIP)'
+
+
+def generar_facturas(modeladmin, request, queryset):
+    # El renderizado se hace en los workers de la cola 'pdf', no en la web.
+    ids = list(queryset.values_list('id', flat=True))
+    generar_facturas_lote.delay(ids)
+    modeladmin.message_user(
+        request, f'Generación de {len(ids)} facturas en curso.'
+    )
+
+generar_facturas.short_description = 'Generar facturas en segundo plano'
+
+
 def detalle_orden(obj):
     url = reverse('ordenes:detalle_orden_admin', args=[obj.id])
     return mark_safe(f'<a href="{url}">Vista</a>')
@@ -91,6 +107,7 @@ class OrdenAdmin(admin.ModelAdmin):
         'codigo_postal',
         'poblacion',
         'pagado',
+        'total',
         pago_orden,
         'actualizado',
         'creado',
@@ -100,4 +117,5 @@ class OrdenAdmin(admin.ModelAdmin):
     list_filter = ['pagado', 'creado', 'usuario', 'actualizado']
     search_fields = ['id', 'email', 'usuario__username']
     inlines = [ItemOrdenEnLinea]
-    actions = [exportar_a_csv]
+    actions = [exportar_a_csv, descargar_facturas, generar_facturas]
+    readonly_fields = ['subtotal', 'importe_descuento', 'total']
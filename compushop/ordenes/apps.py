@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrdenesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ordenes'
+
+    def ready(self):
+        # Registra los receptores que mantienen los totales de las órdenes.
+        from . import signals  # noqa: F401
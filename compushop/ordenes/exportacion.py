@@ -0,0 +1,86 @@
+import csv
+import datetime
+from django.db.models import Prefetch
+from .models import ItemOrden, Orden
+
+
+class Eco:
+    '''
+        Pseudo-buffer para csv.writer: en lugar de acumular lo escrito lo
+        devuelve, de modo que cada fila puede enviarse en cuanto se genera.
+    '''
+
+    def write(self, valor):
+        return valor
+
+
+def campos_orden():
+    # Campos propios de la orden (sin relaciones inversas ni many to many).
+    return [
+        campo
+        for campo in Orden._meta.get_fields()
+        if not campo.many_to_many and not campo.one_to_many
+    ]
+
+
+def cabecera_ordenes():
+    return [campo.verbose_name for campo in campos_orden()] + ['Items']
+
+
+def filas_ordenes(queryset, chunk_size=2000):
+    '''
+        Genera una fila por orden leyendo el queryset por bloques. Las
+        relaciones se cargan con select_related y los items con un prefetch
+        por bloque, así que el número de consultas no depende de las filas.
+    '''
+    campos = campos_orden()
+    queryset = queryset.select_related('usuario', 'cupon').prefetch_related(
+        Prefetch(
+            'items',
+            queryset=ItemOrden.objects.select_related('producto').only(
+                'orden_id', 'precio', 'cantidad', 'producto__nombre'
+            )
+        )
+    )
+    for orden in queryset.iterator(chunk_size=chunk_size):
+        fila = []
+        for campo in campos:
+            valor = getattr(orden, campo.name)
+            # Si hay un objeto datetime debemos pasarlo a string para el CSV
+            if isinstance(valor, datetime.datetime):
+                valor = valor.strftime('%d/%m/%Y')
+            fila.append(valor)
+        fila.append('; '.join(
+            f'{item.producto.nombre} x{item.cantidad} ({item.precio})'
+            for item in orden.items.all()
+        ))
+        yield fila
+
+
+def lineas_csv(cabecera, filas):
+    '''
+        Convierte la cabecera y las filas en líneas CSV una a una.
+    '''
+    escritor = csv.writer(Eco())
+    yield escritor.writerow(cabecera)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def exportar_ordenes_csv(queryset, chunk_size=2000):
+    return lineas_csv(cabecera_ordenes(), filas_ordenes(queryset, chunk_size))
+
+
+def exportador_ordenes(filtros):
+    '''
+        Exportador de órdenes para los trabajos en segundo plano (ver
+        exportaciones/registro.py). Filtros: desde, hasta y pagado.
+    '''
+    ordenes = Orden.objects.order_by('id')
+    if filtros.get('desde'):
+        ordenes = ordenes.filter(creado__date__gte=filtros['desde'])
+    if filtros.get('hasta'):
+        ordenes = ordenes.filter(creado__date__lte=filtros['hasta'])
+    if filtros.get('pagado') is not None:
+        ordenes = ordenes.filter(pagado=filtros['pagado'])
+    return cabecera_ordenes(), ordenes.count(), filas_ordenes(ordenes)
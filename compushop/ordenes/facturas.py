@@ -0,0 +1,166 @@
+import hashlib
+import zipfile
+from functools import lru_cache
+import weasyprint
+from weasyprint.text.fonts import FontConfiguration
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.template.loader import render_to_string
+from .models import Orden
+
+
+'''
+    Caché de facturas en PDF.
+
+    El PDF se guarda en el almacenamiento privado de Orden.factura (fuera de
+    MEDIA_ROOT, solo se sirve desde las vistas) bajo un nombre que incluye
+    la huella (sha256) del HTML de la factura y de la hoja de estilos. Mientras
+    la orden no cambie la huella es la misma y se sirve el archivo guardado;
+    renderizar el HTML cuesta milisegundos, WeasyPrint segundos.
+'''
+
+
+almacenamiento = Orden._meta.get_field('factura').storage
+
+
+@lru_cache(maxsize=1)
+def configuracion_fuentes():
+    # Las fuentes cargadas se comparten entre todas las facturas del proceso.
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=1)
+def hojas_estilos():
+    '''
+        Devuelve (stylesheets, huella) de css/pdf.css. Se busca y se parsea
+        una sola vez por proceso.
+    '''
+    ruta = finders.find('css/pdf.css')
+    if not ruta:
+        return None, ''
+    with open(ruta, 'rb') as archivo:
+        huella = hashlib.sha256(archivo.read()).hexdigest()
+    return [weasyprint.CSS(ruta, font_config=configuracion_fuentes())], huella
+
+
+def ordenes_para_factura(ordenes=None):
+    # Todo lo que usa la plantilla de la factura en tres consultas.
+    if ordenes is None:
+        ordenes = Orden.objects.all()
+    return ordenes.select_related('cupon').prefetch_related('items__producto')
+
+
+def cargar_orden(id_orden):
+    return ordenes_para_factura().get(id=id_orden)
+
+
+def html_factura(orden):
+    return render_to_string('ordenes/orden/pdf.html', {'orden': orden})
+
+
+def renderizar_pdf(html):
+    stylesheets, _ = hojas_estilos()
+    return weasyprint.HTML(string=html).write_pdf(
+        stylesheets=stylesheets, font_config=configuracion_fuentes()
+    )
+
+
+def nombre_factura(orden, html=None):
+    # El nombre cambia con el contenido de la factura y con la hoja de estilos.
+    html = html if html is not None else html_factura(orden)
+    _, huella_estilos = hojas_estilos()
+    huella = hashlib.sha256(
+        (huella_estilos + html).encode()
+    ).hexdigest()[:20]
+    return f'facturas/orden_{orden.id}_{huella}.pdf'
+
+
+def factura_vigente(orden):
+    '''
+        Nombre del PDF guardado si corresponde a la versión actual de la
+        orden, o None si hay que generarlo. No llama a WeasyPrint, así que
+        puede usarse desde las vistas.
+    '''
+    nombre = nombre_factura(orden)
+    if almacenamiento.exists(nombre):
+        return nombre
+    return None
+
+
+def obtener_factura(orden):
+    '''
+        Devuelve el nombre en el almacenamiento del PDF de la factura,
+        generándolo solo si la orden ha cambiado desde la última vez. La
+        versión anterior se elimina al generar una nueva.
+        Renderiza con WeasyPrint: solo debe llamarse desde las tareas de la
+        cola 'pdf' (ver tasks.py).
+    '''
+    html = html_factura(orden)
+    nombre = nombre_factura(orden, html)
+    if orden.factura.name == nombre and almacenamiento.exists(nombre):
+        return nombre
+    if not almacenamiento.exists(nombre):
+        # save() puede devolver otro nombre si otro proceso acaba de guardar
+        # la misma versión; nos quedamos con el que se haya escrito.
+        nombre = almacenamiento.save(
+            nombre, ContentFile(renderizar_pdf(html))
+        )
+    anterior = orden.factura.name
+    # update() para no tocar actualizado ni lanzar señales.
+    Orden.objects.filter(id=orden.id).update(factura=nombre)
+    orden.factura.name = nombre
+    if anterior and anterior != nombre:
+        almacenamiento.delete(anterior)
+    return nombre
+
+
+class BufferZip:
+    '''
+        Destino sin posicionamiento para zipfile: guarda lo escrito hasta que
+        se recoge con vaciar(), de modo que el ZIP puede enviarse por partes.
+    '''
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def zip_facturas(ordenes, chunk_size=100, pendientes=None):
+    '''
+        Genera un ZIP con las facturas ya generadas de las órdenes, emitiendo
+        los bytes de cada archivo en cuanto se añade. Las que falten no se
+        renderizan aquí: sus ids se añaden a pendientes (si se indica) y el
+        ZIP incluye un PENDIENTES.txt con la lista.
+    '''
+    if pendientes is None:
+        pendientes = []
+    buffer = BufferZip()
+    # Los PDF ya van comprimidos: ZIP_STORED evita gastar CPU otra vez.
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archivo_zip:
+        for orden in ordenes_para_factura(ordenes).iterator(chunk_size):
+            nombre = factura_vigente(orden)
+            if nombre is None:
+                pendientes.append(orden.id)
+                continue
+            with almacenamiento.open(nombre, 'rb') as pdf:
+                archivo_zip.writestr(f'orden_{orden.id}.pdf', pdf.read())
+            yield buffer.vaciar()
+        if pendientes:
+            archivo_zip.writestr('PENDIENTES.txt', (
+                'Facturas en generación, vuelve a descargarlas en unos '
+                'minutos:\n'
+                + '\n'.join(f'orden_{id}.pdf' for id in pendientes)
+                + '\n'
+            ))
+    yield buffer.vaciar()
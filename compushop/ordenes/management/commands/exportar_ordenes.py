@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from ordenes.exportacion import exportar_ordenes_csv
+from ordenes.models import Orden
+
+
+class Command(BaseCommand):
+    help = "Exporta las órdenes y sus items a un archivo CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help='Archivo CSV de destino.')
+        parser.add_argument(
+            '--pagadas', action='store_true',
+            help='Exporta solo las órdenes pagadas.'
+        )
+        parser.add_argument(
+            '--desde', help='Exporta las órdenes creadas desde esta fecha (AAAA-MM-DD).'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Órdenes leídas por consulta.'
+        )
+
+    def handle(self, *args, **options):
+        ordenes = Orden.objects.order_by('id')
+        if options['pagadas']:
+            ordenes = ordenes.filter(pagado=True)
+        if options['desde']:
+            ordenes = ordenes.filter(creado__date__gte=options['desde'])
+        filas = 0
+        with open(options['ruta'], 'w', newline='', encoding='utf-8') as archivo:
+            for linea in exportar_ordenes_csv(ordenes, options['chunk_size']):
+                archivo.write(linea)
+                filas += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas - 1} órdenes exportadas a {options['ruta']}."
+        ))
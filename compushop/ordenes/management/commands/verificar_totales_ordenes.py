@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Sum
+from ordenes.models import Orden, calcular_importes
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprueba que los totales guardados en las órdenes coinciden con "
+        "sus items y, con --corregir, repara los que no coinciden"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir', action='store_true',
+            help='Guarda los totales recalculados de las órdenes incorrectas.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Órdenes leídas y actualizadas por lote.'
+        )
+
+    def handle(self, *args, **options):
+        campos = ['subtotal', 'importe_descuento', 'total']
+        ordenes = Orden.objects.annotate(
+            subtotal_items=Sum(
+                F('items__precio') * F('items__cantidad'),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+        ).only('id', 'descuento', *campos).order_by('id')
+        revisadas = errores = 0
+        incorrectas = []
+        for orden in ordenes.iterator(chunk_size=options['chunk_size']):
+            revisadas += 1
+            esperado = calcular_importes(orden.subtotal_items or 0, orden.descuento)
+            guardado = (orden.subtotal, orden.importe_descuento, orden.total)
+            if esperado == guardado:
+                continue
+            self.stdout.write(self.style.WARNING(
+                f'Orden {orden.id}: guardado {guardado}, esperado {esperado}'
+            ))
+            errores += 1
+            orden.subtotal, orden.importe_descuento, orden.total = esperado
+            incorrectas.append(orden)
+            if options['corregir'] and len(incorrectas) >= options['chunk_size']:
+                Orden.objects.bulk_update(incorrectas, campos)
+                incorrectas = []
+        if options['corregir'] and incorrectas:
+            Orden.objects.bulk_update(incorrectas, campos)
+        accion = 'corregidas' if options['corregir'] else 'incorrectas'
+        self.stdout.write(self.style.SUCCESS(
+            f'{revisadas} órdenes revisadas, {errores} {accion}.'
+        ))
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:04
+
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+
+
+def rellenar_totales(apps, schema_editor):
+    """
+    Calcula los totales de las órdenes existentes. El subtotal se agrega en
+    SQL y las órdenes se actualizan por lotes con bulk_update.
+    """
+    Orden = apps.get_model('ordenes', 'Orden')
+    centimos = Decimal('0.01')
+    ordenes = Orden.objects.annotate(
+        subtotal_items=Sum(
+            F('items__precio') * F('items__cantidad'),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        )
+    ).only('id', 'descuento')
+    lote = []
+    for orden in ordenes.iterator(chunk_size=2000):
+        subtotal = Decimal(orden.subtotal_items or 0).quantize(
+            centimos, rounding=ROUND_HALF_UP
+        )
+        descuento = Decimal('0.00')
+        if orden.descuento:
+            descuento = (subtotal * (orden.descuento / Decimal(100))).quantize(
+                centimos, rounding=ROUND_HALF_UP
+            )
+        orden.subtotal = subtotal
+        orden.importe_descuento = descuento
+        orden.total = subtotal - descuento
+        lote.append(orden)
+        if len(lote) >= 2000:
+            Orden.objects.bulk_update(
+                lote, ['subtotal', 'importe_descuento', 'total']
+            )
+            lote = []
+    Orden.objects.bulk_update(lote, ['subtotal', 'importe_descuento', 'total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordenes', '0002_orden_usuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orden',
+            name='importe_descuento',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Importe descuento'),
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Subtotal'),
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Total'),
+        ),
+        migrations.RunPython(rellenar_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordenes', '0003_orden_totales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orden',
+            name='factura',
+            field=models.FileField(blank=True, editable=False, upload_to='facturas/'),
+        ),
+    ]
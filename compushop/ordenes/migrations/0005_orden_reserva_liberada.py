@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordenes', '0004_orden_factura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orden',
+            name='reserva_liberada',
+            field=models.BooleanField(default=False, verbose_name='Reserva liberada'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:10
+
+from django.db import migrations
+
+
+def marcar_reservas_liberadas(apps, schema_editor):
+    """
+    Las órdenes anteriores a la reserva de stock nunca descontaron stock:
+    se marcan como liberadas para que liberar_reservas_caducadas no devuelva
+    al inventario unidades que no se reservaron.
+    """
+    Orden = apps.get_model('ordenes', 'Orden')
+    Orden.objects.filter(reserva_liberada=False).update(reserva_liberada=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordenes', '0005_orden_reserva_liberada'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            marcar_reservas_liberadas, migrations.RunPython.noop
+        ),
+    ]
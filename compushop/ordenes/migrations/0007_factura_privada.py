@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:52
+
+import exportaciones.models
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def mover_facturas(apps, schema_editor):
+    """
+    Mueve los PDF ya generados de MEDIA_ROOT (accesibles bajo MEDIA_URL) al
+    almacenamiento privado.
+    """
+    Orden = apps.get_model('ordenes', 'Orden')
+    privado = exportaciones.models.almacenamiento_privado()
+    ordenes = Orden.objects.exclude(factura='').only('id', 'factura')
+    for orden in ordenes.iterator(chunk_size=2000):
+        nombre = orden.factura.name
+        if not default_storage.exists(nombre):
+            continue
+        if not privado.exists(nombre):
+            with default_storage.open(nombre, 'rb') as archivo:
+                privado.save(nombre, archivo)
+        default_storage.delete(nombre)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordenes', '0006_marcar_reservas_existentes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orden',
+            name='factura',
+            field=models.FileField(blank=True, editable=False, storage=exportaciones.models.almacenamiento_privado, upload_to='facturas/'),
+        ),
+        migrations.RunPython(mover_facturas, migrations.RunPython.noop),
+    ]
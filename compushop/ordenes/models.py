@@ -1,13 +1,29 @@
 from decimal import ROUND_HALF_UP, Decimal
 from django.core.validators import MaxValueValidator, MinValueValidator
 from cupones.models import Cupon
+from exportaciones.models import almacenamiento_privado
 from django.db import models
+from django.db.models import DecimalField, F, Sum
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 # Create your models here.
 
 
+def calcular_importes(subtotal, porcentaje_descuento):
+    '''
+        Devuelve (subtotal, importe_descuento, total) redondeados a céntimos.
+    '''
+    centimos = Decimal('0.01')
+    subtotal = Decimal(subtotal).quantize(centimos, rounding=ROUND_HALF_UP)
+    descuento = Decimal('0.00')
+    if porcentaje_descuento:
+        descuento = (
+            subtotal * (porcentaje_descuento / Decimal(100))
+        ).quantize(centimos, rounding=ROUND_HALF_UP)
+    return subtotal, descuento, subtotal - descuento
+
+
 class Orden(models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -31,6 +47,13 @@ class Orden(models.Model):
     creado = models.DateTimeField(_("Creado"), auto_now_add=True)
     actualizado = models.DateTimeField(_("Actualizado"), auto_now=True)
     pagado = models.BooleanField(_("Pagado"), default=False)
+    # El stock se reserva al crear la orden. Si no se paga en
+    # ORDENES_RESERVA_MINUTOS se devuelve al inventario (ver
+    # servicios.liberar_reserva) y se marca aquí. Las órdenes anteriores a la
+    # reserva de stock se marcaron como liberadas (migración 0006).
+    reserva_liberada = models.BooleanField(
+        _("Reserva liberada"), default=False
+    )
     stripe_id = models.CharField(max_length=250,blank=True)
 
     # Campos para los cupones.
@@ -46,6 +69,31 @@ class Orden(models.Model):
         default=0,
         validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
+    # Totales desnormalizados. Se mantienen con actualizar_totales() cada vez
+    # que cambian los items (ver signals.py) y en save() si cambia el
+    # descuento o el cupón, para poder ordenar, filtrar y agregar por importe
+    # en SQL sin recorrer los items de cada orden.
+    subtotal = models.DecimalField(
+        _("Subtotal"), max_digits=10, decimal_places=2, default=Decimal('0.00')
+    )
+    importe_descuento = models.DecimalField(
+        _("Importe descuento"),
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    total = models.DecimalField(
+        _("Total"), max_digits=10, decimal_places=2, default=Decimal('0.00')
+    )
+    # Último PDF generado de la factura (ver facturas.py). El nombre incluye
+    # la huella de su contenido, así que cambia con cada versión de la orden.
+    # Contiene datos del cliente: se guarda fuera de MEDIA_ROOT.
+    factura = models.FileField(
+        upload_to='facturas/',
+        storage=almacenamiento_privado,
+        blank=True,
+        editable=False
+    )
     # Clase Meta, metadatos o atributos de configuración de la clase que
     # definen el comportamiento del modelo a nivel de como django los manipula
     # muestra o guarda.
@@ -60,9 +108,36 @@ class Orden(models.Model):
     def __str__(self):
         return f'Orden {self.id}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        orden = super().from_db(db, field_names, values)
+        # Con only()/defer() sin estos campos no se vigilan los cambios.
+        if {'descuento', 'cupon_id'}.issubset(field_names):
+            orden._descuento_guardado = orden.descuento_actual()
+        return orden
+
+    def descuento_actual(self):
+        return self.descuento, self.cupon_id
+
+    def save(self, *args, **kwargs):
+        '''
+            Si la orden ya existe y ha cambiado su descuento o su cupón,
+            recalcula los totales antes de guardarla. Las órdenes nuevas los
+            calcula quien crea sus items (ver servicios.py).
+        '''
+        guardado = getattr(self, '_descuento_guardado', None)
+        if guardado is not None and guardado != self.descuento_actual():
+            self.calcular_totales()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, 'subtotal', 'importe_descuento', 'total'
+                }
+        super().save(*args, **kwargs)
+        self._descuento_guardado = self.descuento_actual()
+
     def precio_total(self):
-        total = self.total_antes_descuento() - self.obtener_descuento()
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return self.total
 
     def obtener_url_stripe(self):
         if not self.stripe_id:
@@ -77,18 +152,48 @@ class Orden(models.Model):
         return f'https://dashboard.stripe.com{path}payments/{self.stripe_id}'
 
     def total_antes_descuento(self):
-        return sum(item.obtener_precio() for item in self.items.all())
+        return self.subtotal
 
     def obtener_descuento(self):
-        total = self.total_antes_descuento()
-        if self.descuento:
-            descuento = total * (self.descuento / Decimal(100))
-            return descuento.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        return Decimal('0.00')
+        return self.importe_descuento
+
+    def calcular_subtotal(self):
+        # Suma de los items calculada en la base de datos.
+        return self.items.aggregate(
+            subtotal=Sum(
+                F('precio') * F('cantidad'),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+        )['subtotal'] or Decimal('0.00')
+
+    def calcular_totales(self, subtotal=None):
+        '''
+            Asigna subtotal, importe_descuento y total sin guardar. Si no se
+            indica el subtotal se calcula a partir de los items.
+        '''
+        if subtotal is None:
+            subtotal = self.calcular_subtotal()
+        (
+            self.subtotal, self.importe_descuento, self.total
+        ) = calcular_importes(subtotal, self.descuento)
+
+    def actualizar_totales(self):
+        '''
+            Recalcula y persiste los totales. Usa update() para no fallar si
+            la orden se está eliminando junto con sus items.
+        '''
+        self.calcular_totales()
+        Orden.objects.filter(pk=self.pk).update(
+            subtotal=self.subtotal,
+            importe_descuento=self.importe_descuento,
+            total=self.total
+        )
 
     @property
     def estado_display(self):
-        return _("Pagada") if self.pagado else _("Pendiente")
+        if self.pagado:
+            return _("Pagada")
+        return _("Caducada") if self.reserva_liberada else _("Pendiente")
 
 
 
@@ -0,0 +1,177 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from tienda import stock
+from tienda.models import Producto
+from .models import ItemOrden, Orden
+
+
+class ErrorCheckout(Exception):
+    '''
+        Error al confirmar una orden. La transacción se deshace por completo.
+    '''
+
+
+class CarroVacio(ErrorCheckout):
+    pass
+
+
+class ProductoNoDisponible(ErrorCheckout):
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(', '.join(str(p) for p in productos))
+
+
+class PrecioModificado(ErrorCheckout):
+    '''
+        El precio de algún producto ha cambiado desde que se añadió al carro.
+        productos contiene las instancias con el precio actual.
+    '''
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(', '.join(str(p) for p in productos))
+
+
+class StockInsuficiente(ErrorCheckout):
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(', '.join(str(p) for p in productos))
+
+
+def crear_orden_desde_carro(orden, carro):
+    '''
+        Confirma la orden (sin guardar) con los items del carro en una única
+        transacción:
+            1. Valida los precios del carro contra Producto.precio.
+            2. Guarda la orden y crea sus items con bulk_create.
+            3. Reserva el stock con stock.ajustar_lote (UPDATE condicional,
+               stock >= cantidad, y movimientos en la misma transacción), por
+               lo que dos checkouts simultáneos no pueden vender la misma
+               unidad.
+        Si algo falla lanza una subclase de ErrorCheckout y no se guarda nada.
+    '''
+    items = list(carro)
+    if not items:
+        raise CarroVacio()
+    cantidades = {
+        item['producto'].id: int(item['cantidad']) for item in items
+    }
+    with transaction.atomic():
+        productos = Producto.objects.in_bulk(list(cantidades))
+        # El carro ya descarta los productos eliminados, pero uno puede
+        # borrarse entre la lectura del carro y esta transacción.
+        eliminados = [
+            item['producto'] for item in items
+            if item['producto'].id not in productos
+        ]
+        if eliminados:
+            raise ProductoNoDisponible(eliminados)
+        no_disponibles = [
+            item['producto'] for item in items
+            if not productos[item['producto'].id].disponible
+        ]
+        if no_disponibles:
+            raise ProductoNoDisponible(no_disponibles)
+        modificados = [
+            productos[item['producto'].id] for item in items
+            if productos[item['producto'].id].precio != item['precio']
+        ]
+        if modificados:
+            raise PrecioModificado(modificados)
+
+        # bulk_create no envía señales: los totales se calculan aquí.
+        orden.calcular_totales(subtotal=sum(
+            productos[id_producto].precio * cantidad
+            for id_producto, cantidad in cantidades.items()
+        ))
+        orden.save()
+        ItemOrden.objects.bulk_create([
+            ItemOrden(
+                orden=orden,
+                producto=productos[id_producto],
+                precio=productos[id_producto].precio,
+                cantidad=cantidad
+            )
+            for id_producto, cantidad in cantidades.items()
+        ])
+        try:
+            stock.ajustar_lote(
+                {id: -cantidad for id, cantidad in cantidades.items()},
+                tipo='salida',
+                usuario=orden.usuario,
+                motivo='Reserva de stock',
+                referencia=f'Orden {orden.id}',
+                invalidar_metricas=False
+            )
+        except stock.StockInsuficiente as e:
+            # La transacción deshace la orden: que la instancia no conserve
+            # un id que ya no existe y pueda volver a guardarse como nueva.
+            orden.id = None
+            orden._state.adding = True
+            raise StockInsuficiente([productos[id] for id in e.ids])
+    return orden
+
+
+def cantidades_orden(id_orden):
+    return dict(
+        ItemOrden.objects.filter(orden_id=id_orden)
+        .values('producto_id')
+        .annotate(cantidad=Sum('cantidad'))
+        .values_list('producto_id', 'cantidad')
+    )
+
+
+def liberar_reserva(id_orden):
+    '''
+        Devuelve al inventario el stock reservado por una orden sin pagar.
+        El UPDATE condicional garantiza que una orden solo se libera una vez
+        y nunca después de pagarse. Devuelve True si la ha liberado.
+    '''
+    with transaction.atomic():
+        liberada = Orden.objects.filter(
+            id=id_orden, pagado=False, reserva_liberada=False
+        ).update(reserva_liberada=True)
+        if not liberada:
+            return False
+        stock.ajustar_lote(
+            cantidades_orden(id_orden),
+            tipo='entrada',
+            motivo='Reserva caducada',
+            referencia=f'Orden {id_orden}',
+            invalidar_metricas=False
+        )
+    return True
+
+
+def ordenes_con_reserva_caducada():
+    limite = timezone.now() - timedelta(
+        minutes=settings.ORDENES_RESERVA_MINUTOS
+    )
+    return Orden.objects.filter(
+        pagado=False, reserva_liberada=False, creado__lt=limite
+    )
+
+
+def volver_a_reservar(id_orden):
+    '''
+        Se llama al pagarse una orden cuya reserva ya había caducado (pago
+        tardío). Reserva de nuevo su stock si sigue habiendo; si no, la orden
+        queda pagada sin reserva y se ve en el admin como pagada con
+        reserva liberada.
+    '''
+    try:
+        with transaction.atomic():
+            cantidades = cantidades_orden(id_orden)
+            stock.ajustar_lote(
+                {id: -cantidad for id, cantidad in cantidades.items()},
+                tipo='salida',
+                motivo='Reserva tras pago tardío',
+                referencia=f'Orden {id_orden}',
+                invalidar_metricas=False
+            )
+            Orden.objects.filter(id=id_orden).update(reserva_liberada=False)
+    except stock.StockInsuficiente:
+        return False
+    return True
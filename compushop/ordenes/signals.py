@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import ItemOrden, Orden
+
+
+@receiver(post_save, sender=ItemOrden)
+@receiver(post_delete, sender=ItemOrden)
+def actualizar_totales_orden(sender, instance, **kwargs):
+    '''
+        Mantiene los totales de la orden al modificar sus items uno a uno
+        (admin, shell...). bulk_create no envía señales: quien lo use debe
+        calcular los totales (ver servicios.crear_orden_desde_carro).
+    '''
+    # La orden puede no existir si se está eliminando en cascada.
+    orden = Orden.objects.filter(pk=instance.orden_id).first()
+    if orden:
+        orden.actualizar_totales()
@@ -20,3 +20,43 @@ def task_orden_creada(id_orden):
         asunto, mensaje, 'admin@compushop.com', [orden.email]
     )
     return correo_enviado
+
+
+@shared_task(name="ordenes.tasks.generar_factura")
+def generar_factura(id_orden):
+    '''
+    Genera (o reutiliza) el PDF de la factura de una orden. Se enruta a la
+    cola 'pdf' (ver CELERY_TASK_ROUTES).
+    '''
+    from .facturas import cargar_orden, obtener_factura
+    return obtener_factura(cargar_orden(id_orden))
+
+
+@shared_task(name="ordenes.tasks.generar_facturas_lote")
+def generar_facturas_lote(ids_ordenes, chunk_size=100):
+    '''
+    Genera las facturas de muchas órdenes en un solo proceso, reutilizando
+    la hoja de estilos y las fuentes cargadas. Devuelve cuántos PDF se han
+    renderizado; el resto ya estaban al día.
+    '''
+    from .facturas import obtener_factura, ordenes_para_factura
+    ordenes = ordenes_para_factura(
+        Orden.objects.filter(id__in=ids_ordenes).order_by('id')
+    )
+    generadas = 0
+    for orden in ordenes.iterator(chunk_size):
+        anterior = orden.factura.name
+        if obtener_factura(orden) != anterior:
+            generadas += 1
+    return generadas
+
+
+@shared_task(name="ordenes.tasks.liberar_reservas_caducadas")
+def liberar_reservas_caducadas():
+    '''
+    Tarea periódica: devuelve al inventario el stock de las órdenes que
+    siguen sin pagar pasados ORDENES_RESERVA_MINUTOS.
+    '''
+    from .servicios import liberar_reserva, ordenes_con_reserva_caducada
+    ids = list(ordenes_con_reserva_caducada().values_list('id', flat=True))
+    return sum(1 for id_orden in ids if liberar_reserva(id_orden))
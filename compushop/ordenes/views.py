@@ -1,13 +1,22 @@
 from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.translation import gettext as _
 from carro.carro import Carro
 from .forms import FormularioCrearOrden
-from .models import Orden, ItemOrden
-from .tasks import task_orden_creada
-import weasyprint
-from django.contrib.staticfiles import finders
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+from .models import Orden
+from .servicios import (
+    CarroVacio,
+    PrecioModificado,
+    ProductoNoDisponible,
+    StockInsuficiente,
+    crear_orden_desde_carro,
+)
+from .tasks import generar_factura, task_orden_creada
+from .facturas import almacenamiento, cargar_orden, factura_vigente
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from django.http import FileResponse, Http404
 
 # Create your views here.
 
@@ -27,15 +36,30 @@ def crear_orden(request):
             if carro.cupon:
                 orden.cupon = carro.cupon
                 orden.descuento = carro.cupon.descuento
-            orden.save()
-            # Crear items desde el carrito.
-            for item in carro:
-                ItemOrden.objects.create(
-                    orden = orden,
-                    producto = item['producto'],
-                    precio = item['precio'],
-                    cantidad = int(item['cantidad'])
+            # Guarda la orden y sus items y reserva el stock en una
+            # sola transacción.
+            try:
+                crear_orden_desde_carro(orden, carro)
+            except CarroVacio:
+                return redirect('carro:detalle_carro')
+            except PrecioModificado as e:
+                for producto in e.productos:
+                    carro.actualizar_precio(producto)
+                messages.warning(
+                    request,
+                    _('El precio de {} ha cambiado. Revisa tu carrito.').format(e)
                 )
+                return redirect('carro:detalle_carro')
+            except ProductoNoDisponible as e:
+                messages.error(
+                    request, _('{} ya no está disponible.').format(e)
+                )
+                return redirect('carro:detalle_carro')
+            except StockInsuficiente as e:
+                messages.error(
+                    request, _('No hay stock suficiente de {}.').format(e)
+                )
+                return redirect('carro:detalle_carro')
             # limpiar el carro
             carro.limpiar()
             # Iniciar asynchronous task
@@ -64,15 +88,35 @@ def detalle_orden_admin(request, id_orden):
 
 @staff_member_required
 def orden_admin_pdf(request, id_orden):
-    orden = get_object_or_404(Orden, id=id_orden)
-    html = render_to_string('ordenes/orden/pdf.html', {'orden': orden})
-    respuesta = HttpResponse(content_type='application/pdf')
-    respuesta['Content-Disposition'] = f'filename=orden_{orden.id}.pdf'
-    weasyprint.HTML(string=html).write_pdf(
-        respuesta,
-        stylesheets=[weasyprint.CSS(finders.find('css/pdf.css'))]
+    try:
+        orden = cargar_orden(id_orden)
+    except Orden.DoesNotExist:
+        raise Http404
+    nombre = factura_vigente(orden)
+    if nombre is None:
+        # WeasyPrint no se ejecuta en la web: el PDF se genera en la cola
+        # 'pdf' y la página se recarga hasta que está listo. cache.add evita
+        # encolar la misma factura en cada recarga; sin caché se encola
+        # igualmente (generarla dos veces solo reutiliza el PDF guardado).
+        try:
+            encolar = cache.add(
+                f'facturas:generando:{orden.id}', 1, timeout=60
+            )
+        except RedisError:
+            encolar = True
+        if encolar:
+            generar_factura.delay(orden.id)
+        return render(
+            request,
+            'admin/ordenes/orden/factura_pendiente.html',
+            {'orden': orden},
+            status=202
+        )
+    return FileResponse(
+        almacenamiento.open(nombre, 'rb'),
+        content_type='application/pdf',
+        filename=f'orden_{orden.id}.pdf'
     )
-    return respuesta
 
 
 def orden_creada(request):
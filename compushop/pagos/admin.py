@@ -1,3 +1,39 @@
 from django.contrib import admin
+from .eventos import eventos_atascados
+from .models import EventoStripe
+from .tasks import procesar_evento_stripe
 
 # Register your models here.
+
+
+def reprocesar_eventos(modeladmin, request, queryset):
+    # Eventos con error y pendientes cuya tarea se ha perdido.
+    errores = list(
+        queryset.filter(estado='error').values_list('id', flat=True)
+    )
+    EventoStripe.objects.filter(id__in=errores).update(estado='pendiente')
+    atascados = list(
+        queryset.filter(id__in=eventos_atascados()).values_list('id', flat=True)
+    )
+    ids = errores + atascados
+    for id_evento in ids:
+        procesar_evento_stripe.delay(id_evento)
+    modeladmin.message_user(request, f'{len(ids)} eventos encolados.')
+
+reprocesar_eventos.short_description = (
+    'Reprocesar eventos con error o pendientes atascados'
+)
+
+
+@admin.register(EventoStripe)
+class EventoStripeAdmin(admin.ModelAdmin):
+    list_display = [
+        'id_evento', 'tipo', 'estado', 'intentos', 'recibido', 'procesado'
+    ]
+    list_filter = ['estado', 'tipo', 'recibido']
+    search_fields = ['id_evento']
+    readonly_fields = [
+        'id_evento', 'tipo', 'payload', 'estado', 'intentos', 'error',
+        'recibido', 'procesado'
+    ]
+    actions = [reprocesar_eventos]
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class PagosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pagos'
+
+    def ready(self):
+        import stripe
+        from django.conf import settings
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        stripe.api_version = settings.STRIPE_API_VERSION
+        stripe.api_base = settings.STRIPE_API_BASE
+        # Cliente con sesión de requests (reutiliza las conexiones) y
+        # timeouts; los reintentos usan claves de idempotencia.
+        stripe.default_http_client = stripe.RequestsClient(
+            timeout=settings.STRIPE_TIMEOUT
+        )
+        stripe.max_network_retries = settings.STRIPE_REINTENTOS
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from celery import chain
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from ordenes.models import Orden
+from ordenes.servicios import volver_a_reservar
+from .models import EventoStripe
+
+
+'''
+    Procesamiento de los eventos del webhook de Stripe.
+
+    El webhook solo verifica la firma, guarda el evento y lo encola
+    (registrar_evento). El worker lo aplica con procesar_evento, que es
+    idempotente: la orden se marca como pagada con un UPDATE condicional
+    (pagado=False), así que solo el primer procesamiento de un pago lanza
+    las tareas posteriores aunque el evento llegue o se procese varias veces.
+'''
+
+
+def registrar_evento(event):
+    '''
+        Guarda el evento (el JSON ya verificado del webhook) si no existía y
+        encola su procesamiento mientras siga pendiente: si el broker falló
+        al recibirlo por primera vez, el reintento de Stripe lo vuelve a
+        encolar. Devuelve False si es un reintento de un evento ya recibido.
+    '''
+    from .tasks import procesar_evento_stripe
+    evento, creado = EventoStripe.objects.get_or_create(
+        id_evento=event['id'],
+        defaults={'tipo': event['type'], 'payload': event}
+    )
+    if evento.estado == 'pendiente':
+        transaction.on_commit(
+            lambda: procesar_evento_stripe.delay(evento.id)
+        )
+    return creado
+
+
+def eventos_atascados():
+    '''
+        Eventos pendientes recibidos hace más de STRIPE_EVENTOS_ESPERA
+        segundos: su tarea se perdió o no llegó a encolarse.
+    '''
+    limite = timezone.now() - timedelta(seconds=settings.STRIPE_EVENTOS_ESPERA)
+    return EventoStripe.objects.filter(estado='pendiente', recibido__lt=limite)
+
+
+def marcar_orden_pagada(id_orden, stripe_id, email_cliente=None):
+    '''
+        Marca la orden como pagada si no lo estaba. Devuelve True solo para
+        la llamada que realmente la ha cambiado.
+    '''
+    with transaction.atomic():
+        pagada = Orden.objects.filter(id=id_orden, pagado=False).update(
+            pagado=True, stripe_id=stripe_id or ''
+        )
+        if pagada and email_cliente:
+            # Si la orden no tiene usuario y el email coincide, asociarlo.
+            usuario = get_user_model().objects.filter(
+                email=email_cliente
+            ).first()
+            if usuario:
+                Orden.objects.filter(
+                    id=id_orden, usuario__isnull=True
+                ).update(usuario=usuario)
+        if pagada:
+            if Orden.objects.filter(
+                id=id_orden, reserva_liberada=True
+            ).exists():
+                # Pago de una orden cuya reserva de stock ya había caducado.
+                volver_a_reservar(id_orden)
+            transaction.on_commit(lambda: tareas_pago_completado(id_orden))
+    return bool(pagada)
+
+
+def tareas_pago_completado(id_orden):
+    from ordenes.tasks import generar_factura
+    from .tasks import pago_completado, registrar_compra
+    registrar_compra.delay(id_orden)
+    # La factura se genera en la cola 'pdf' y después se envía por e-mail
+    # reutilizando el PDF guardado.
+    chain(
+        generar_factura.si(id_orden),
+        pago_completado.si(id_orden)
+    ).delay()
+
+
+def aplicar_checkout_completado(objeto):
+    # Solo si se trata de un pago directo y fue exitoso
+    if objeto.get('mode') != 'payment' or objeto.get('payment_status') != 'paid':
+        return False
+    id_orden = objeto.get('client_reference_id')
+    if not id_orden:
+        raise ValueError('No se encontró client_reference_id en la sesión.')
+    if not Orden.objects.filter(id=id_orden).exists():
+        raise ValueError(f'No existe la orden {id_orden}.')
+    email_cliente = (objeto.get('customer_details') or {}).get('email')
+    marcar_orden_pagada(id_orden, objeto.get('payment_intent'), email_cliente)
+    return True
+
+
+def aplicar_payment_intent(objeto):
+    id_orden = (objeto.get('metadata') or {}).get('orden_id')
+    if not id_orden:
+        return False
+    marcar_orden_pagada(id_orden, objeto['id'])
+    return True
+
+
+MANEJADORES = {
+    'checkout.session.completed': aplicar_checkout_completado,
+    'payment_intent.succeeded': aplicar_payment_intent,
+}
+
+
+def procesar_evento(evento):
+    '''
+        Aplica un evento guardado y actualiza su estado.
+    '''
+    EventoStripe.objects.filter(id=evento.id).update(
+        intentos=evento.intentos + 1
+    )
+    manejador = MANEJADORES.get(evento.tipo)
+    try:
+        aplicado = manejador is not None and manejador(
+            evento.payload['data']['object']
+        )
+    except Exception as e:
+        EventoStripe.objects.filter(id=evento.id).update(
+            estado='error', error=str(e)
+        )
+        raise
+    EventoStripe.objects.filter(id=evento.id).update(
+        estado='procesado' if aplicado else 'ignorado',
+        error='',
+        procesado=timezone.now()
+    )
@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from django.utils import translation
+from tienda.models import Producto
+
+
+PASOS = [
+    'listado', 'producto', 'carro', 'crear_orden', 'pago', 'pasarela',
+    'completado'
+]
+
+
+def percentil(valores, p):
+    # valores ya ordenados.
+    if not valores:
+        return 0
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga del checkout: listado → producto → carro → orden → "
+        "pago → pasarela → webhook, con varios clientes en paralelo. "
+        "Necesita la tienda arrancada con STRIPE_API_BASE apuntando a "
+        "servidor_stripe_falso."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sitio', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--stripe', default='http://127.0.0.1:12111',
+            help='URL de servidor_stripe_falso (para las estadísticas del webhook).'
+        )
+        parser.add_argument(
+            '--usuarios', type=int, default=10, help='Clientes concurrentes.'
+        )
+        parser.add_argument(
+            '--iteraciones', type=int, default=5,
+            help='Checkouts completos por cliente.'
+        )
+        parser.add_argument(
+            '--espera-webhook', type=float, default=10,
+            help='Segundos máximos de espera para los webhooks pendientes.'
+        )
+
+    def handle(self, *args, **options):
+        self.sitio = options['sitio'].rstrip('/')
+        with translation.override(settings.LANGUAGE_CODE):
+            self.urls = {
+                'listado': reverse('tienda:listado_productos'),
+                'crear_orden': reverse('ordenes:crear_orden'),
+                'pago': reverse('pagos:proceso'),
+            }
+            self.productos = [
+                (p.get_absolute_url(), reverse('carro:aniadir_a_carro', args=[p.id]))
+                for p in Producto.objects.filter(disponible=True, stock__gt=0)
+            ]
+        if not self.productos:
+            self.stderr.write('No hay productos disponibles con stock.')
+            return
+        requests.get(f"{options['stripe']}/estadisticas?reiniciar=1", timeout=5)
+
+        self.tiempos = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.lock = threading.Lock()
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['usuarios']) as ejecutor:
+            completados = sum(ejecutor.map(
+                lambda _: self.cliente(options['iteraciones']),
+                range(options['usuarios'])
+            ))
+        duracion = time.perf_counter() - inicio
+
+        # Los webhooks se entregan en segundo plano: esperamos a que lleguen.
+        limite = time.monotonic() + options['espera_webhook']
+        while True:
+            estadisticas = requests.get(
+                f"{options['stripe']}/estadisticas", timeout=5
+            ).json()
+            entregados = (
+                len(estadisticas['webhook']) + estadisticas['errores_webhook']
+            )
+            if entregados >= completados or time.monotonic() > limite:
+                break
+            time.sleep(0.2)
+        self.tiempos['webhook'] = estadisticas['webhook']
+        self.errores['webhook'] = estadisticas['errores_webhook']
+        self.informe(completados, duracion)
+
+    def cliente(self, iteraciones):
+        completados = 0
+        for _ in range(iteraciones):
+            # Sesión nueva por checkout: carro y cookies vacíos.
+            with requests.Session() as http:
+                try:
+                    self.checkout(http)
+                    completados += 1
+                except requests.RequestException:
+                    pass
+        return completados
+
+    def paso(self, nombre, http, metodo, url, esperado=(200,), **kwargs):
+        if url.startswith('/'):
+            url = self.sitio + url
+        csrf = http.cookies.get('csrftoken')
+        if metodo == 'post' and csrf:
+            kwargs.setdefault('data', {})['csrfmiddlewaretoken'] = csrf
+        inicio = time.perf_counter()
+        try:
+            respuesta = http.request(
+                metodo, url, allow_redirects=False, timeout=30, **kwargs
+            )
+        except requests.RequestException:
+            with self.lock:
+                self.errores[nombre] += 1
+            raise
+        duracion = time.perf_counter() - inicio
+        with self.lock:
+            if respuesta.status_code in esperado:
+                self.tiempos[nombre].append(duracion)
+            else:
+                self.errores[nombre] += 1
+        if respuesta.status_code not in esperado:
+            raise requests.RequestException(
+                f'{nombre}: HTTP {respuesta.status_code}'
+            )
+        return respuesta
+
+    def checkout(self, http):
+        url_producto, url_carro = random.choice(self.productos)
+        self.paso('listado', http, 'get', self.urls['listado'])
+        self.paso('producto', http, 'get', url_producto)
+        self.paso(
+            'carro', http, 'post', url_carro, esperado=(302,),
+            data={'cantidad': 1}
+        )
+        self.paso('crear_orden', http, 'get', self.urls['crear_orden'])
+        self.paso(
+            'crear_orden', http, 'post', self.urls['crear_orden'],
+            esperado=(302,),
+            data={
+                'nombre': 'Prueba',
+                'primer_apellido': 'Carga',
+                'email': 'carga@example.com',
+                'direccion': 'Calle Falsa 123',
+                'codigo_postal': '01001',
+                'poblacion': 'Vitoria-Gasteiz',
+            }
+        )
+        self.paso('pago', http, 'get', self.urls['pago'])
+        pasarela = self.paso(
+            'pago', http, 'post', self.urls['pago'], esperado=(302, 303)
+        ).headers['Location']
+        completado = self.paso(
+            'pasarela', http, 'get', pasarela, esperado=(303,)
+        ).headers['Location']
+        self.paso('completado', http, 'get', completado)
+
+    def informe(self, completados, duracion):
+        self.stdout.write(
+            f'{completados} checkouts en {duracion:.1f} s '
+            f'({completados / duracion:.2f} checkouts/s)\n'
+        )
+        self.stdout.write(
+            f"{'paso':<12}{'n':>7}{'errores':>9}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        for nombre in PASOS + ['webhook']:
+            valores = sorted(self.tiempos[nombre])
+            self.stdout.write(
+                f'{nombre:<12}{len(valores):>7}{self.errores[nombre]:>9}'
+                f'{len(valores) / duracion:>9.1f}'
+                + ''.join(
+                    f'{valor * 1000:>9.0f}' for valor in (
+                        percentil(valores, 50),
+                        percentil(valores, 90),
+                        percentil(valores, 99),
+                        valores[-1] if valores else 0,
+                    )
+                )
+            )
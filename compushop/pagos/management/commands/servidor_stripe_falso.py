@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from django.utils import translation
+from pagos.stripe_falso import crear_servidor
+
+
+class Command(BaseCommand):
+    help = (
+        "Arranca un servidor que imita la API de Stripe (sesiones de pago, "
+        "cupones y webhooks firmados). Para usarlo, definir "
+        "STRIPE_API_BASE=http://<host>:<puerto> en el entorno de la tienda."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--puerto', type=int, default=12111)
+        parser.add_argument(
+            '--sitio', default='http://127.0.0.1:8000',
+            help='URL base de la tienda a la que se envían los webhooks.'
+        )
+        parser.add_argument(
+            '--latencia', type=float, default=0,
+            help='Segundos de espera añadidos a cada llamada a la API.'
+        )
+
+    def handle(self, *args, **options):
+        with translation.override(settings.LANGUAGE_CODE):
+            url_webhook = options['sitio'].rstrip('/') + reverse(
+                'pagos:stripe-webhook'
+            )
+        servidor = crear_servidor(
+            options['host'],
+            options['puerto'],
+            url_webhook,
+            settings.STRIPE_WEBHOOK_SECRET,
+            options['latencia']
+        )
+        self.stdout.write(
+            f"Stripe falso en {servidor.estado.url_base} "
+            f"(webhook: {url_webhook}). Ctrl+C para salir."
+        )
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
@@ -1,3 +1,38 @@
 from django.db import models
 
 # Create your models here.
+
+
+class EventoStripe(models.Model):
+    '''
+        Registro de los eventos recibidos en el webhook de Stripe. El id del
+        evento es único, de modo que los reintentos de Stripe no crean un
+        segundo registro ni se procesan dos veces (ver eventos.py).
+    '''
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesado', 'Procesado'),
+        ('ignorado', 'Ignorado'),
+        ('error', 'Error'),
+    ]
+    id_evento = models.CharField(max_length=255, unique=True)
+    tipo = models.CharField(max_length=100)
+    payload = models.JSONField()
+    estado = models.CharField(
+        max_length=10, choices=ESTADOS, default='pendiente'
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    recibido = models.DateTimeField(auto_now_add=True)
+    procesado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-recibido']
+        indexes = [
+            models.Index(fields=['estado', 'recibido']),
+        ]
+        verbose_name = 'Evento de Stripe'
+        verbose_name_plural = 'Eventos de Stripe'
+
+    def __str__(self):
+        return f'{self.tipo} {self.id_evento}'
@@ -0,0 +1,264 @@
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import requests
+
+
+'''
+    Servidor que imita la parte de la API de Stripe que usa la tienda, para
+    pruebas de carga sin salir de la máquina (ver servidor_stripe_falso y
+    prueba_carga_checkout):
+        - POST /v1/checkout/sessions: crea una sesión de pago.
+        - POST /v1/coupons y GET /v1/coupons/<id>: cupones.
+        - GET /pagar/<id>: hace de página de pago. Redirige a success_url y
+          envía el evento checkout.session.completed firmado al webhook.
+        - GET /estadisticas: latencias de entrega del webhook.
+'''
+
+
+def firmar_evento(payload, secreto, marca_tiempo=None):
+    '''
+        Cabecera Stripe-Signature (t=...,v1=...) con la misma firma HMAC
+        SHA-256 que comprueba stripe.Webhook.construct_event.
+    '''
+    marca_tiempo = marca_tiempo or int(time.time())
+    firma = hmac.new(
+        secreto.encode(),
+        f'{marca_tiempo}.{payload}'.encode(),
+        hashlib.sha256
+    ).hexdigest()
+    return f't={marca_tiempo},v1={firma}'
+
+
+def desanidar(datos):
+    '''
+        Convierte los parámetros de formulario de Stripe
+        (line_items[0][quantity]=2) en dicts y listas.
+    '''
+    resultado = {}
+    for clave, valor in datos:
+        partes = re.findall(r'[^\[\]]+', clave)
+        actual = resultado
+        for parte in partes[:-1]:
+            actual = actual.setdefault(parte, {})
+        actual[partes[-1]] = valor
+    return convertir_listas(resultado)
+
+
+def convertir_listas(valor):
+    if not isinstance(valor, dict):
+        return valor
+    if valor and all(clave.isdigit() for clave in valor):
+        return [
+            convertir_listas(valor[clave])
+            for clave in sorted(valor, key=int)
+        ]
+    return {clave: convertir_listas(v) for clave, v in valor.items()}
+
+
+class EstadoStripe:
+    '''
+        Sesiones, cupones y estadísticas del servidor, compartidos por los
+        hilos que atienden las peticiones.
+    '''
+
+    def __init__(self, url_base, url_webhook, secreto, latencia=0):
+        self.url_base = url_base
+        self.url_webhook = url_webhook
+        self.secreto = secreto
+        self.latencia = latencia
+        self.sesiones = {}
+        self.cupones = {}
+        self.entregas = []
+        self.errores_webhook = 0
+        self.lock = threading.Lock()
+        self.envios = ThreadPoolExecutor(max_workers=16)
+        self.http = requests.Session()
+
+    def crear_sesion(self, datos):
+        id_sesion = f'cs_test_{uuid.uuid4().hex}'
+        importe = sum(
+            int(linea['price_data']['unit_amount']) * int(linea['quantity'])
+            for linea in datos.get('line_items', [])
+        )
+        sesion = {
+            'id': id_sesion,
+            'object': 'checkout.session',
+            'mode': datos.get('mode', 'payment'),
+            'payment_status': 'unpaid',
+            'status': 'open',
+            'client_reference_id': datos.get('client_reference_id'),
+            'success_url': datos.get('success_url'),
+            'cancel_url': datos.get('cancel_url'),
+            'amount_total': importe,
+            'currency': 'usd',
+            'payment_intent': None,
+            'url': f'{self.url_base}/pagar/{id_sesion}',
+        }
+        with self.lock:
+            self.sesiones[id_sesion] = sesion
+        return sesion
+
+    def crear_cupon(self, datos):
+        cupon = {
+            'id': datos.get('id') or f'cpn_{uuid.uuid4().hex[:12]}',
+            'object': 'coupon',
+            'name': datos.get('name'),
+            'percent_off': float(datos.get('percent_off') or 0),
+            'duration': datos.get('duration', 'once'),
+            'valid': True,
+        }
+        with self.lock:
+            if cupon['id'] in self.cupones:
+                return None
+            self.cupones[cupon['id']] = cupon
+        return cupon
+
+    def pagar(self, id_sesion):
+        with self.lock:
+            sesion = self.sesiones.get(id_sesion)
+            if sesion is None or sesion['payment_status'] == 'paid':
+                return sesion
+            sesion.update(
+                payment_status='paid',
+                status='complete',
+                payment_intent=f'pi_{uuid.uuid4().hex[:24]}'
+            )
+            evento = {
+                'id': f'evt_{uuid.uuid4().hex}',
+                'object': 'event',
+                'type': 'checkout.session.completed',
+                'created': int(time.time()),
+                'data': {'object': dict(sesion)},
+            }
+        # Como Stripe, el webhook se envía después de redirigir al cliente.
+        self.envios.submit(self.enviar_webhook, evento)
+        return sesion
+
+    def enviar_webhook(self, evento):
+        payload = json.dumps(evento)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.http.post(
+                self.url_webhook,
+                data=payload,
+                headers={
+                    'Content-Type': 'application/json',
+                    'Stripe-Signature': firmar_evento(payload, self.secreto),
+                },
+                timeout=30
+            )
+            correcto = respuesta.status_code == 200
+        except requests.RequestException:
+            correcto = False
+        with self.lock:
+            if correcto:
+                self.entregas.append(time.perf_counter() - inicio)
+            else:
+                self.errores_webhook += 1
+
+    def estadisticas(self, reiniciar=False):
+        with self.lock:
+            datos = {
+                'webhook': list(self.entregas),
+                'errores_webhook': self.errores_webhook,
+            }
+            if reiniciar:
+                self.entregas = []
+                self.errores_webhook = 0
+        return datos
+
+
+class ManejadorStripe(BaseHTTPRequestHandler):
+    # ThreadingHTTPServer atiende cada conexión en su propio hilo.
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def estado(self):
+        return self.server.estado
+
+    def log_message(self, formato, *args):
+        pass
+
+    def responder(self, estado, datos=None, cabeceras=None):
+        cuerpo = json.dumps(datos).encode() if datos is not None else b''
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for clave, valor in (cabeceras or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def no_encontrado(self, mensaje):
+        self.responder(404, {'error': {
+            'type': 'invalid_request_error',
+            'code': 'resource_missing',
+            'message': mensaje,
+        }})
+
+    def do_POST(self):
+        if self.estado.latencia:
+            time.sleep(self.estado.latencia)
+        longitud = int(self.headers.get('Content-Length', 0))
+        datos = desanidar(parse_qsl(
+            self.rfile.read(longitud).decode(), keep_blank_values=True
+        ))
+        ruta = urlsplit(self.path).path
+        if ruta == '/v1/checkout/sessions':
+            self.responder(200, self.estado.crear_sesion(datos))
+        elif ruta == '/v1/coupons':
+            cupon = self.estado.crear_cupon(datos)
+            if cupon is None:
+                self.responder(400, {'error': {
+                    'type': 'invalid_request_error',
+                    'code': 'resource_already_exists',
+                    'message': 'Coupon already exists.',
+                }})
+            else:
+                self.responder(200, cupon)
+        else:
+            self.no_encontrado(f'Unrecognized request URL: {ruta}')
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        ruta = partes.path
+        if ruta.startswith('/v1/coupons/'):
+            if self.estado.latencia:
+                time.sleep(self.estado.latencia)
+            cupon = self.estado.cupones.get(ruta.rsplit('/', 1)[-1])
+            if cupon is None:
+                self.no_encontrado('No such coupon.')
+            else:
+                self.responder(200, cupon)
+        elif ruta.startswith('/pagar/'):
+            sesion = self.estado.pagar(ruta.rsplit('/', 1)[-1])
+            if sesion is None:
+                self.no_encontrado('No such checkout session.')
+            else:
+                self.responder(
+                    303, cabeceras={'Location': sesion['success_url']}
+                )
+        elif ruta == '/estadisticas':
+            self.responder(200, self.estado.estadisticas(
+                reiniciar='reiniciar' in partes.query
+            ))
+        else:
+            self.no_encontrado(f'Unrecognized request URL: {ruta}')
+
+
+def crear_servidor(host, puerto, url_webhook, secreto, latencia=0):
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorStripe)
+    servidor.daemon_threads = True
+    servidor.estado = EstadoStripe(
+        f'http://{host}:{servidor.server_port}', url_webhook, secreto,
+        latencia
+    )
+    return servidor
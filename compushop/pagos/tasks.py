@@ -1,22 +1,23 @@
-from io import BytesIO
-import weasyprint
 from celery import shared_task
-from django.contrib.staticfiles import finders
+from redis.exceptions import RedisError
 from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 
-@shared_task
-def pago_completado(id_orden):
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def pago_completado(self, id_orden):
     '''
     Tarea que envía un e-mail con la factura PDF tras completar el pago.
+    Se encadena después de generar_factura (cola 'pdf') y nunca renderiza
+    el PDF: solo lee el ya guardado.
     '''
     print(f"\n===> Ejecutando tarea pago_completado para orden ID: {id_orden}")
 
     # IMPORT LAZY para evitar AppRegistryNotReady
+    from ordenes.facturas import almacenamiento, cargar_orden, factura_vigente
     from ordenes.models import Orden
+    from ordenes.tasks import generar_factura
 
     try:
-        orden = Orden.objects.get(id=id_orden)
+        orden = cargar_orden(id_orden)
     except Orden.DoesNotExist:
         print(f"===> ERROR: La orden con ID {id_orden} no existe.")
         return
@@ -31,33 +32,75 @@ def pago_completado(id_orden):
         [orden.email]
     )
 
-    # Renderizar HTML
-    print("===> Renderizando HTML de factura...")
-    html = render_to_string('ordenes/orden/pdf.html', {'orden': orden})
-    salida = BytesIO()
-
-    # Buscar hoja de estilos
-    stylesheet_path = finders.find('css/pdf.css')
-    if stylesheet_path:
-        print(f"===> Hoja de estilos encontrada: {stylesheet_path}")
-        stylesheets = [weasyprint.CSS(stylesheet_path)]
-    else:
-        print("===> ADVERTENCIA: No se encontró 'static/css/pdf.css'. Se generará sin estilos.")
-        stylesheets = None
-
-    # Generar PDF
+    # Factura guardada por generar_factura. Si la orden ha cambiado desde
+    # entonces, se vuelve a generar en la cola 'pdf' y se reintenta el envío.
+    print("===> Obteniendo PDF de factura...")
+    nombre = factura_vigente(orden)
+    if nombre is None:
+        print("===> La factura no está generada; se encola y se reintenta.")
+        generar_factura.delay(orden.id)
+        raise self.retry()
     try:
-        weasyprint.HTML(string=html).write_pdf(salida, stylesheets=stylesheets)
-        print("===> PDF generado correctamente.")
+        with almacenamiento.open(nombre, 'rb') as archivo:
+            pdf = archivo.read()
+        print("===> PDF leído correctamente.")
     except Exception as e:
-        print(f"===> ERROR generando PDF: {e}")
+        print(f"===> ERROR leyendo PDF: {e}")
         return
 
     # Adjuntar y enviar correo
-    email.attach(f'orden_{orden.id}.pdf', salida.getvalue(), 'application/pdf')
+    email.attach(f'orden_{orden.id}.pdf', pdf, 'application/pdf')
 
     try:
         email.send()
         print(f"===> Email enviado correctamente a {orden.email}\n")
     except Exception as e:
         print(f"===> ERROR al enviar email: {e}")
+
+
+@shared_task(
+    autoretry_for=(Exception,), retry_backoff=True, max_retries=5
+)
+def procesar_evento_stripe(id_evento):
+    '''
+    Aplica un evento del webhook de Stripe guardado en EventoStripe. Si
+    falla se reintenta con espera creciente; el evento queda en 'error'
+    hasta que un reintento lo aplica.
+    '''
+    from .eventos import procesar_evento
+    from .models import EventoStripe
+
+    evento = EventoStripe.objects.filter(id=id_evento).first()
+    if evento is None or evento.estado in ('procesado', 'ignorado'):
+        return
+    procesar_evento(evento)
+    print(f"===> Evento {evento.id_evento} ({evento.tipo}) procesado.")
+
+
+@shared_task
+def reencolar_eventos_stripe():
+    '''
+    Tarea periódica: vuelve a encolar los eventos que siguen pendientes
+    tras STRIPE_EVENTOS_ESPERA segundos. procesar_evento es idempotente, así
+    que encolar dos veces el mismo evento no tiene efectos duplicados.
+    '''
+    from .eventos import eventos_atascados
+
+    ids = list(eventos_atascados().values_list('id', flat=True))
+    for id_evento in ids:
+        procesar_evento_stripe.delay(id_evento)
+    return len(ids)
+
+
+@shared_task(
+    autoretry_for=(RedisError,), retry_backoff=True, max_retries=5
+)
+def registrar_compra(id_orden):
+    '''
+    Actualiza el recomendador con los productos de una orden pagada.
+    '''
+    from ordenes.models import Orden
+    from tienda.recomendador import Recomendador
+
+    orden = Orden.objects.prefetch_related('items').get(id=id_orden)
+    Recomendador().productos_comprados(orden)
@@ -1,3 +1,104 @@
-from django.test import TestCase
+import json
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from ordenes.models import Orden
+from .eventos import procesar_evento
+from .models import EventoStripe
+from .stripe_falso import firmar_evento
+from .tasks import procesar_evento_stripe
 
-# Create your tests here.
+SECRETO = 'whsec_pruebas'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=SECRETO)
+@mock.patch('pagos.eventos.tareas_pago_completado')
+@mock.patch('pagos.tasks.procesar_evento_stripe.delay')
+class WebhookStripeTests(TestCase):
+    '''
+        Stripe puede entregar el mismo evento varias veces: solo debe
+        guardarse una vez y la orden solo debe pagarse (y lanzar sus tareas)
+        una vez.
+    '''
+
+    def setUp(self):
+        self.orden = Orden.objects.create(
+            nombre='Ana',
+            primer_apellido='García',
+            email='ana@example.com',
+            direccion='Calle Mayor 1',
+            codigo_postal='28001',
+            poblacion='Madrid'
+        )
+        self.payload = json.dumps({
+            'id': 'evt_prueba',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'object': 'checkout.session',
+                'mode': 'payment',
+                'payment_status': 'paid',
+                'client_reference_id': str(self.orden.id),
+                'payment_intent': 'pi_prueba',
+            }},
+        })
+
+    def enviar(self, firma=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('pagos:stripe-webhook'),
+                self.payload,
+                content_type='application/json',
+                HTTP_STRIPE_SIGNATURE=firma or firmar_evento(
+                    self.payload, SECRETO
+                )
+            )
+
+    def procesar(self, id_evento):
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_evento_stripe(id_evento)
+
+    def test_evento_duplicado_se_guarda_una_vez(self, delay, tareas):
+        self.assertEqual(self.enviar().status_code, 200)
+        self.assertEqual(self.enviar().status_code, 200)
+        evento = EventoStripe.objects.get()
+        self.assertEqual(evento.id_evento, 'evt_prueba')
+        # Mientras siga pendiente, cada entrega lo vuelve a encolar.
+        self.assertEqual(delay.call_args_list, [mock.call(evento.id)] * 2)
+
+    def test_evento_duplicado_paga_la_orden_una_vez(self, delay, tareas):
+        self.enviar()
+        self.enviar()
+        evento = EventoStripe.objects.get()
+        for args in delay.call_args_list:
+            self.procesar(*args.args)
+        self.orden.refresh_from_db()
+        self.assertTrue(self.orden.pagado)
+        self.assertEqual(self.orden.stripe_id, 'pi_prueba')
+        tareas.assert_called_once_with(str(self.orden.id))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos), ('procesado', 1))
+
+    def test_entrega_tras_procesar_no_encola(self, delay, tareas):
+        self.enviar()
+        self.procesar(EventoStripe.objects.get().id)
+        delay.reset_mock()
+        self.assertEqual(self.enviar().status_code, 200)
+        delay.assert_not_called()
+        tareas.assert_called_once_with(str(self.orden.id))
+
+    def test_procesamientos_simultaneos_pagan_una_vez(self, delay, tareas):
+        # Dos workers con el mismo evento aún pendiente: el UPDATE
+        # condicional solo deja marcar la orden a uno de ellos.
+        self.enviar()
+        evento = EventoStripe.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_evento(evento)
+            procesar_evento(evento)
+        tareas.assert_called_once_with(str(self.orden.id))
+
+    def test_firma_invalida(self, delay, tareas):
+        respuesta = self.enviar(firma=firmar_evento(self.payload, 'otro'))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(EventoStripe.objects.exists())
+        delay.assert_not_called()
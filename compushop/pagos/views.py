@@ -1,14 +1,15 @@
+from datetime import timedelta
 from decimal import Decimal
 import stripe
 from django.conf import settings
+from django.utils import timezone
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from cupones.pasarela import id_cupon_stripe
 from ordenes.models import Orden
 
 # Create your views here.
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
-stripe.api_version = settings.STRIPE_API_VERSION
+# La configuración del cliente de Stripe está en apps.py.
 
 def pago_proceso(request):
     id_orden = request.session.get('id_orden')
@@ -26,6 +27,13 @@ def pago_proceso(request):
             'client_reference_id': orden.id,
             'success_url': success_url,
             'cancel_url': cancel_url,
+            # La sesión caduca con la reserva de stock de la orden (Stripe
+            # exige al menos 30 minutos).
+            'expires_at': int(max(
+                orden.creado
+                + timedelta(minutes=settings.ORDENES_RESERVA_MINUTOS),
+                timezone.now() + timedelta(minutes=30)
+            ).timestamp()),
             'line_items': []
         }
         # Añadir los productos de la orden a la sesión de pago de Stripe
@@ -42,27 +50,26 @@ def pago_proceso(request):
                     'quantity': item.cantidad,
                 }
             )
-        # Cupon stripe
+        # Cupon stripe (se crea una sola vez por cupón y porcentaje).
         if orden.cupon:
-            cupon_stripe = stripe.Coupon.create(
-                name=orden.cupon.codigo,
-                percent_off=orden.descuento,
-                duration='once'
-            )
-            session_data['discounts'] = [{'coupon': cupon_stripe.id}]
+            session_data['discounts'] = [{
+                'coupon': id_cupon_stripe(orden.cupon, orden.descuento)
+            }]
         # Crear la sesión de pago de Stripe
         session = stripe.checkout.Session.create(**session_data)
         # Redirigir al formulario de pago de Stripe
-        return redirect(session.url, code=303)
+        respuesta = redirect(session.url)
+        respuesta.status_code = 303
+        return respuesta
     else:
         return render(request, 'pagos/proceso.html', locals())
 
 
 def pago_completado(request):
+    # La orden la marca como pagada el webhook de Stripe (ver eventos.py);
+    # llegar a esta URL no garantiza que el pago se haya realizado.
     id_orden = request.session.get('id_orden')
     orden = get_object_or_404(Orden, id=id_orden)
-    orden.pagado = True
-    orden.save(update_fields=['pagado'])
     return render(request, 'pagos/completado.html', {'orden': orden})
 
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TiendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tienda'
+
+    def ready(self):
+        # Registra los receptores que invalidan la caché del catálogo.
+        from . import signals  # noqa: F401
@@ -0,0 +1,246 @@
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import translation
+from redis.exceptions import RedisError
+from .respaldo import Cortocircuito
+
+
+'''
+    Caché de fragmentos del catálogo.
+
+    Cada fragmento se guarda bajo una clave que incluye un número de versión.
+    En lugar de borrar fragmentos, al modificar un producto o una categoría se
+    incrementa la versión correspondiente (ver signals.py) y las claves
+    antiguas dejan de usarse hasta que expiran:
+        - catalogo:listado:<id_categoria|todos>:version -> páginas del grid.
+        - catalogo:producto:<id>:version -> tarjeta de un producto.
+        - catalogo:menu:version -> menú de categorías.
+        - inventario:version -> métricas de inventario de los dashboards
+          (cambia con cualquier producto, proveedor o ajuste de stock del
+          personal; no con las reservas de los checkouts).
+
+    Si Redis no responde (ver los timeouts de CACHES) las funciones públicas
+    recurren directamente a la base de datos: la caché nunca debe tumbar ni
+    bloquear el catálogo.
+'''
+
+CLAVE_VERSION_MENU = 'catalogo:menu:version'
+CLAVE_VERSION_INVENTARIO = 'inventario:version'
+CLAVE_ACIERTOS = 'catalogo:estadisticas:aciertos'
+CLAVE_FALLOS = 'catalogo:estadisticas:fallos'
+
+# Tras varios fallos seguidos de Redis se deja de intentar durante un tiempo
+# y el catálogo se sirve directamente desde la base de datos.
+circuito = Cortocircuito(
+    settings.CATALOGO_CACHE_FALLOS_MAXIMOS, settings.CATALOGO_CACHE_REINTENTO
+)
+
+
+def clave_version_listado(id_categoria=None):
+    return f'catalogo:listado:{id_categoria or "todos"}:version'
+
+
+def clave_version_producto(id_producto):
+    return f'catalogo:producto:{id_producto}:version'
+
+
+def version_inicial():
+    # Partimos de un valor basado en el reloj para que una versión expulsada
+    # de la caché no vuelva a empezar en un número ya usado.
+    return int(time.time() * 1000)
+
+
+def obtener_versiones(claves):
+    '''
+        Devuelve un dict {clave: versión}, inicializando las que no existan.
+    '''
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            cache.add(clave, version_inicial(), timeout=None)
+            versiones[clave] = cache.get(clave)
+    return versiones
+
+
+def obtener_version(clave):
+    return obtener_versiones([clave])[clave]
+
+
+def incrementar_version(*claves):
+    if not circuito.permite():
+        return
+    for clave in claves:
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # No existía: la próxima lectura la inicializará con otro valor.
+            pass
+        except RedisError:
+            # Sin Redis no hay nada que invalidar ahora; lo que quede
+            # cacheado caduca con CATALOGO_CACHE_TIMEOUT.
+            circuito.registrar_fallo()
+            return
+
+
+def con_respaldo(usar_cache, generar):
+    '''
+        Devuelve usar_cache() o, si Redis falla o el circuito está abierto,
+        generar() sin caché.
+    '''
+    if not circuito.permite():
+        return generar()
+    try:
+        valor = usar_cache()
+    except RedisError:
+        circuito.registrar_fallo()
+        return generar()
+    circuito.registrar_exito()
+    return valor
+
+
+def contar(clave, cantidad=1):
+    '''
+        Contadores de aciertos y fallos. Solo se escriben en una fracción
+        CATALOGO_CACHE_MUESTREO de las llamadas, con el peso equivalente,
+        para no añadir un INCR a cada petición.
+    '''
+    muestreo = settings.CATALOGO_CACHE_MUESTREO
+    if not cantidad or not muestreo or random.random() >= muestreo:
+        return
+    cantidad = round(cantidad / muestreo)
+    try:
+        try:
+            cache.incr(clave, cantidad)
+        except ValueError:
+            cache.add(clave, 0, timeout=None)
+            cache.incr(clave, cantidad)
+    except RedisError:
+        pass
+
+
+def estadisticas():
+    '''
+        Contadores (estimados por muestreo) de aciertos y fallos de la caché
+        del catálogo.
+    '''
+    valores = cache.get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos = valores.get(CLAVE_ACIERTOS, 0)
+    fallos = valores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'ratio_aciertos': round(aciertos / total, 4) if total else 0,
+    }
+
+
+def obtener_o_generar(clave, generar):
+    '''
+        Devuelve el valor cacheado en clave o lo genera llamando a generar().
+    '''
+    valor = cache.get(clave)
+    if valor is None:
+        contar(CLAVE_FALLOS)
+        valor = generar()
+        try:
+            cache.set(clave, valor, settings.CATALOGO_CACHE_TIMEOUT)
+        except RedisError:
+            pass
+    else:
+        contar(CLAVE_ACIERTOS)
+    return valor
+
+
+def categorias_menu():
+    '''
+        Lista de categorías activas para el menú principal.
+    '''
+    from .models import Categoria
+
+    def generar():
+        return list(Categoria.objects.filter(activo=True))
+
+    return con_respaldo(
+        lambda: obtener_o_generar(
+            f'catalogo:menu:v{obtener_version(CLAVE_VERSION_MENU)}', generar
+        ),
+        generar
+    )
+
+
+def tarjetas_productos(productos):
+    '''
+        Devuelve el HTML de la tarjeta de cada producto, en el mismo orden.
+        Las tarjetas cacheadas se recuperan con una sola lectura y solo se
+        renderizan las que faltan.
+    '''
+    return con_respaldo(
+        lambda: tarjetas_cacheadas(productos),
+        lambda: [renderizar_tarjeta(p) for p in productos]
+    )
+
+
+def renderizar_tarjeta(producto):
+    return render_to_string(
+        'tienda/producto/tarjeta.html', {'producto': producto}
+    )
+
+
+def tarjetas_cacheadas(productos):
+    idioma = translation.get_language()
+    versiones = obtener_versiones(
+        [clave_version_producto(p.id) for p in productos]
+    )
+    claves = [
+        f'catalogo:tarjeta:{p.id}:v{versiones[clave_version_producto(p.id)]}'
+        f':{idioma}'
+        for p in productos
+    ]
+    tarjetas = cache.get_many(claves)
+    nuevas = {}
+    for clave, producto in zip(claves, productos):
+        if clave not in tarjetas:
+            nuevas[clave] = renderizar_tarjeta(producto)
+    if nuevas:
+        try:
+            cache.set_many(nuevas, settings.CATALOGO_CACHE_TIMEOUT)
+        except RedisError:
+            pass
+    contar(CLAVE_ACIERTOS, len(tarjetas))
+    contar(CLAVE_FALLOS, len(nuevas))
+    tarjetas.update(nuevas)
+    return [tarjetas[clave] for clave in claves]
+
+
+def invalidar_producto(producto, id_categoria_anterior=None):
+    '''
+        Invalida la tarjeta del producto y las páginas del listado general y
+        de su categoría (y de la anterior si ha cambiado de categoría).
+    '''
+    claves = [
+        clave_version_producto(producto.id),
+        clave_version_listado(),
+        clave_version_listado(producto.categoria_id),
+    ]
+    if id_categoria_anterior and id_categoria_anterior != producto.categoria_id:
+        claves.append(clave_version_listado(id_categoria_anterior))
+    incrementar_version(*claves, CLAVE_VERSION_INVENTARIO)
+
+
+def invalidar_categoria(categoria):
+    '''
+        Las páginas del grid solo dependen de los productos; un cambio en la
+        categoría solo afecta al menú.
+    '''
+    incrementar_version(CLAVE_VERSION_MENU)
+
+
+def invalidar_inventario():
+    '''
+        Marca como obsoletas las métricas de inventario (ver
+        cuentas/utils/instantanea.py).
+    '''
+    incrementar_version(CLAVE_VERSION_INVENTARIO)
@@ -1,11 +1,12 @@
-from .models import Categoria
+from .cache import categorias_menu
 
 
 def categorias_disponibles(request):
     """
     Devuelve todas las categorías activas para mostrarlas en el menú principal.
+    La lista se cachea con la versión del menú (ver tienda/cache.py).
     """
 
     return {
-        'categorias_menu': Categoria.objects.filter(activo=True)
+        'categorias_menu': categorias_menu()
     }
@@ -0,0 +1,46 @@
+from django.utils import timezone
+from .models import Producto, StockMovimiento
+
+
+'''
+    Exportadores del almacén para los trabajos en segundo plano (ver
+    exportaciones/registro.py). Cada uno devuelve (cabecera, total, filas)
+    y lee las filas con values_list por bloques, sin crear instancias.
+'''
+
+
+def exportador_movimientos(filtros):
+    movimientos = StockMovimiento.objects.order_by('creado_en', 'id')
+    if filtros.get('desde'):
+        movimientos = movimientos.filter(creado_en__date__gte=filtros['desde'])
+    if filtros.get('hasta'):
+        movimientos = movimientos.filter(creado_en__date__lte=filtros['hasta'])
+    if filtros.get('tipo'):
+        movimientos = movimientos.filter(tipo=filtros['tipo'])
+    cabecera = [
+        'Fecha', 'Producto', 'Tipo', 'Cantidad', 'Referencia', 'Motivo',
+        'Usuario'
+    ]
+    filas = (
+        [timezone.localtime(creado_en).strftime('%d/%m/%Y %H:%M'), *resto]
+        for creado_en, *resto in movimientos.values_list(
+            'creado_en', 'producto__nombre', 'tipo', 'cantidad',
+            'referencia', 'motivo', 'usuario__username'
+        ).iterator(chunk_size=2000)
+    )
+    return cabecera, movimientos.count(), filas
+
+
+def exportador_inventario(filtros):
+    productos = Producto.objects.order_by('nombre', 'id')
+    if filtros.get('proveedor'):
+        productos = productos.filter(proveedor_id=filtros['proveedor'])
+    cabecera = [
+        'ID', 'Producto', 'Categoría', 'Proveedor', 'Precio', 'Stock',
+        'Stock mínimo', 'Disponible'
+    ]
+    filas = productos.values_list(
+        'id', 'nombre', 'categoria__nombre', 'proveedor__nombre_empresa',
+        'precio', 'stock', 'stock_minimo', 'disponible'
+    ).iterator(chunk_size=2000)
+    return cabecera, productos.count(), filas
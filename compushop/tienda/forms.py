@@ -5,3 +5,15 @@ class AjusteStockForm(forms.Form):
     tipo = forms.ChoiceField(choices=[('entrada','Entrada'),('salida','Salida'),('ajuste','Ajuste')])
     motivo = forms.CharField(required=False)
     referencia = forms.CharField(required=False)
+
+
+class RecepcionStockForm(forms.Form):
+    archivo = forms.FileField(help_text="CSV con las columnas producto (slug o id), cantidad y referencia.")
+    referencia = forms.CharField(required=False, max_length=50, help_text="Para las líneas sin referencia propia.")
+    aplicar = forms.BooleanField(required=False, help_text="Sin marcar solo se valida el archivo.")
+
+
+class FiltroMovimientosForm(forms.Form):
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    tipo = forms.ChoiceField(required=False, choices=[('', 'Todos'), ('entrada','Entrada'), ('salida','Salida'), ('ajuste','Ajuste')])
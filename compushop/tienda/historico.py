@@ -0,0 +1,119 @@
+import datetime
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import Producto, StockMovimiento, StockSnapshot
+
+
+'''
+    Consultas sobre el histórico de stock.
+
+    El stock en un momento dado se calcula como la última foto diaria
+    (StockSnapshot) anterior más la suma de los movimientos desde entonces,
+    de modo que solo se leen los movimientos de un intervalo corto usando
+    el índice (producto, creado_en). Sin foto se parte del stock actual y se
+    restan los movimientos posteriores.
+'''
+
+
+def fin_del_dia(fecha):
+    # Primer instante del día siguiente en la zona horaria del proyecto.
+    return timezone.make_aware(
+        datetime.datetime.combine(fecha + datetime.timedelta(days=1), datetime.time.min)
+    )
+
+
+def suma_movimientos(desde=None, hasta=None, ids=None):
+    '''
+        {id_producto: suma de cantidades} de los movimientos en
+        (desde, hasta].
+    '''
+    movimientos = StockMovimiento.objects.order_by()
+    if desde is not None:
+        movimientos = movimientos.filter(creado_en__gte=desde)
+    if hasta is not None:
+        movimientos = movimientos.filter(creado_en__lt=hasta)
+    if ids is not None:
+        movimientos = movimientos.filter(producto_id__in=ids)
+    return dict(
+        movimientos.values('producto_id').annotate(total=Sum('cantidad'))
+        .values_list('producto_id', 'total')
+    )
+
+
+def stock_en(momento, ids=None):
+    '''
+        {id_producto: stock} en el instante momento para los productos ids
+        (todos si no se indican).
+    '''
+    productos = Producto.objects.order_by()
+    if ids is not None:
+        productos = productos.filter(id__in=ids)
+    actual = dict(productos.values_list('id', 'stock'))
+    fecha = StockSnapshot.objects.filter(
+        fecha__lt=timezone.localtime(momento).date()
+    ).order_by('-fecha').values_list('fecha', flat=True).first()
+    stock = {}
+    if fecha is not None:
+        fotos = dict(
+            StockSnapshot.objects.filter(fecha=fecha, producto_id__in=actual)
+            .values_list('producto_id', 'stock')
+        )
+        posteriores = suma_movimientos(fin_del_dia(fecha), momento, list(actual))
+        for id in fotos:
+            stock[id] = fotos[id] + posteriores.get(id, 0)
+    # Productos sin foto (o sin ninguna foto previa): hacia atrás desde hoy.
+    sin_foto = [id for id in actual if id not in stock]
+    if sin_foto:
+        posteriores = suma_movimientos(momento, None, sin_foto)
+        for id in sin_foto:
+            stock[id] = actual[id] - posteriores.get(id, 0)
+    return stock
+
+
+def stock_producto_en(id_producto, momento):
+    return stock_en(momento, [id_producto]).get(id_producto)
+
+
+def totales_periodo(desde, hasta, ids=None, por_producto=False):
+    '''
+        Entradas, salidas y neto de los movimientos entre las fechas desde y
+        hasta (ambas incluidas). Con por_producto devuelve un dict por id.
+    '''
+    movimientos = StockMovimiento.objects.order_by().filter(
+        creado_en__gte=fin_del_dia(desde - datetime.timedelta(days=1)),
+        creado_en__lt=fin_del_dia(hasta)
+    )
+    if ids is not None:
+        movimientos = movimientos.filter(producto_id__in=ids)
+    agregados = dict(
+        entradas=Sum('cantidad', filter=Q(cantidad__gt=0), default=0),
+        salidas=Sum('cantidad', filter=Q(cantidad__lt=0), default=0),
+        neto=Sum('cantidad', default=0),
+    )
+    if not por_producto:
+        return movimientos.aggregate(**agregados)
+    return {
+        fila.pop('producto_id'): fila
+        for fila in movimientos.values('producto_id').annotate(**agregados)
+    }
+
+
+def tomar_snapshot(fecha=None):
+    '''
+        Guarda el stock de todos los productos al final de fecha (ayer por
+        defecto). Si ya existía la foto de ese día se sobrescribe.
+    '''
+    fecha = fecha or timezone.localdate() - datetime.timedelta(days=1)
+    posteriores = suma_movimientos(fin_del_dia(fecha))
+    fotos = [
+        StockSnapshot(producto_id=id, fecha=fecha, stock=stock - posteriores.get(id, 0))
+        for id, stock in Producto.objects.order_by().values_list('id', 'stock').iterator()
+    ]
+    StockSnapshot.objects.bulk_create(
+        fotos,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['producto', 'fecha'],
+        update_fields=['stock']
+    )
+    return len(fotos)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from tienda.recepcion import leer_recepcion
+
+
+class Command(BaseCommand):
+    help = (
+        "Registra la recepción de mercancía desde el CSV de un proveedor "
+        "(columnas producto, cantidad y referencia). Sin --aplicar solo "
+        "valida el archivo y muestra el resumen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help='Archivo CSV del proveedor.')
+        parser.add_argument(
+            '--aplicar', action='store_true',
+            help='Aplica los cambios de stock (por defecto es una simulación).'
+        )
+        parser.add_argument(
+            '--referencia', default='',
+            help='Referencia para las líneas sin referencia propia.'
+        )
+
+    def handle(self, *args, **options):
+        with open(options['ruta'], newline='', encoding='utf-8-sig') as archivo:
+            recepcion = leer_recepcion(archivo)
+        self.stdout.write(
+            f'{recepcion.lineas} líneas, {len(recepcion.deltas)} productos, '
+            f'{recepcion.unidades} unidades, '
+            f'{recepcion.total_errores} errores.'
+        )
+        for linea, mensaje in recepcion.errores:
+            self.stdout.write(f'  línea {linea}: {mensaje}')
+        if not recepcion.valida:
+            raise CommandError('El archivo tiene errores; no se aplica nada.')
+        if not options['aplicar']:
+            self.stdout.write('Simulación: usa --aplicar para registrar la recepción.')
+            return
+        recepcion.aplicar(referencia=options['referencia'])
+        self.stdout.write(self.style.SUCCESS('Recepción registrada.'))
@@ -0,0 +1,46 @@
+from itertools import groupby
+from operator import itemgetter
+from django.core.management.base import BaseCommand
+from ordenes.models import ItemOrden
+from tienda.recomendador import Recomendador, conexion_sin_timeout
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el modelo de compras conjuntas del recomendador en Redis "
+        "a partir de los items de las órdenes pagadas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Filas de ItemOrden leídas por consulta.'
+        )
+        parser.add_argument(
+            '--max-pares', type=int, default=500_000,
+            help='Pares distintos acumulados en memoria antes de volcarlos a Redis.'
+        )
+
+    def handle(self, *args, **options):
+        # Items de las órdenes pagadas ordenados por orden, leídos en bloques
+        # para no cargar el historial completo en memoria.
+        filas = (
+            ItemOrden.objects.filter(orden__pagado=True)
+            .order_by('orden_id')
+            .values_list('orden_id', 'producto_id')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        cestas = (
+            [id_producto for _, id_producto in items]
+            for _, items in groupby(filas, key=itemgetter(0))
+        )
+        recomendador = Recomendador(cliente=conexion_sin_timeout())
+        estadisticas = recomendador.reconstruir(
+            cestas, max_pares=options['max_pares']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{estadisticas['cestas']} órdenes procesadas en "
+            f"{estadisticas['volcados']} volcados: "
+            f"{estadisticas['productos']} productos con recomendaciones, "
+            f"{estadisticas['eliminadas']} claves obsoletas eliminadas."
+        ))
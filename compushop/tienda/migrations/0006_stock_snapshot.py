@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0005_categoria_activo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('stock', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovimiento',
+            index=models.Index(fields=['producto', 'creado_en'], name='tienda_stoc_product_6d64b3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovimiento',
+            index=models.Index(fields=['tipo', 'creado_en'], name='tienda_stoc_tipo_ebd99b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovimiento',
+            index=models.Index(fields=['-creado_en'], name='tienda_stoc_creado__f26a9e_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='tienda.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['fecha'], name='tienda_stoc_fecha_4be19c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='snapshot_producto_fecha'),
+        ),
+    ]
@@ -102,12 +102,14 @@ class Producto(models.Model):
         return self.stock <= self.stock_minimo
 
     def ajustar_stock(self, delta, tipo='ajuste', usuario=None, motivo='', referencia=''):
-        self.stock = models.F('stock') + delta
-        self.save(update_fields=['stock'])
-        self.refresh_from_db(fields=['stock'])
-        from .models import StockMovimiento
-        StockMovimiento.objects.create(
-            producto=self, tipo=tipo, cantidad=delta, motivo=motivo, usuario=usuario, referencia=referencia
+        '''
+        Ajusta el stock con el servicio de stock.py (UPDATE condicional y
+        movimiento en la misma transacción). Lanza stock.StockInsuficiente
+        si el stock quedaría negativo.
+        '''
+        from .stock import ajustar
+        self.stock = ajustar(
+            self.id, delta, tipo=tipo, usuario=usuario, motivo=motivo, referencia=referencia
         )
         return self.stock
 
@@ -182,3 +184,29 @@ class StockMovimiento(models.Model):
 
     class Meta:
         ordering = ['-creado_en']
+        indexes = [
+            # Histórico por producto y resúmenes por tipo en un periodo.
+            models.Index(fields=['producto', 'creado_en']),
+            models.Index(fields=['tipo', 'creado_en']),
+            models.Index(fields=['-creado_en']),
+        ]
+
+
+class StockSnapshot(models.Model):
+    '''
+        Stock de un producto al final del día fecha. Los toma a diario la
+        tarea tomar_snapshot_stock y permiten calcular el stock histórico
+        como foto + movimientos posteriores (ver historico.py).
+    '''
+    producto = models.ForeignKey('Producto', on_delete=models.CASCADE, related_name='snapshots')
+    fecha = models.DateField()
+    stock = models.IntegerField()
+
+    class Meta:
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='snapshot_producto_fecha'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha']),
+        ]
@@ -0,0 +1,64 @@
+import base64
+import binascii
+import json
+from django.conf import settings
+from django.db.models import Q
+
+
+def codificar_cursor(producto):
+    '''
+        Codifica la posición de un producto (nombre, id) como un cursor opaco
+        apto para usar en la URL.
+    '''
+    posicion = json.dumps([producto.nombre, producto.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(posicion.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    '''
+        Devuelve la tupla (nombre, id) codificada en el cursor, o None si el
+        cursor no es válido.
+    '''
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        nombre, id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return str(nombre), int(id)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def obtener_por_pagina(request):
+    '''
+        Tamaño de página pedido con ?por_pagina=, acotado por
+        PRODUCTOS_POR_PAGINA_MAX. Si no se indica usa PRODUCTOS_POR_PAGINA.
+    '''
+    try:
+        por_pagina = int(request.GET.get('por_pagina', ''))
+    except ValueError:
+        return settings.PRODUCTOS_POR_PAGINA
+    return max(1, min(por_pagina, settings.PRODUCTOS_POR_PAGINA_MAX))
+
+
+def paginar_por_cursor(productos, cursor=None, por_pagina=None):
+    '''
+        Paginación keyset sobre el índice de nombre (con id como desempate).
+        En lugar de OFFSET filtra los productos posteriores al cursor, de modo
+        que el coste de cada página no depende de su profundidad.
+
+        Devuelve la lista de productos de la página y el cursor de la
+        siguiente (None si es la última).
+    '''
+    por_pagina = por_pagina or settings.PRODUCTOS_POR_PAGINA
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion:
+        nombre, id = posicion
+        productos = productos.filter(
+            Q(nombre__gt=nombre) | Q(nombre=nombre, id__gt=id)
+        )
+    # Pedimos un producto de más para saber si existe otra página.
+    pagina = list(productos.order_by('nombre', 'id')[:por_pagina + 1])
+    siguiente_cursor = None
+    if len(pagina) > por_pagina:
+        pagina = pagina[:por_pagina]
+        siguiente_cursor = codificar_cursor(pagina[-1])
+    return pagina, siguiente_cursor
@@ -0,0 +1,118 @@
+import csv
+from collections import Counter
+from .models import Producto
+from .stock import ajustar_lote
+
+
+'''
+    Recepción de mercancía desde el CSV de un proveedor.
+
+    Columnas (con cabecera): producto (slug o id), cantidad y, opcionalmente,
+    referencia (albarán). El archivo se valida en una sola pasada sin
+    cargarlo entero; las cantidades se acumulan por producto y se aplican
+    con stock.ajustar_lote, un movimiento por producto y referencia.
+'''
+
+MAX_ERRORES = 100
+MOTIVO = 'Recepción de proveedor'
+
+
+class Recepcion:
+    def __init__(self):
+        self.lineas = 0
+        self.errores = []
+        self.total_errores = 0
+        self.deltas = Counter()
+        self.por_referencia = Counter()
+
+    @property
+    def valida(self):
+        return self.lineas > 0 and not self.total_errores
+
+    @property
+    def unidades(self):
+        return sum(self.deltas.values())
+
+    def error(self, linea, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((linea, mensaje))
+
+    def aplicar(self, usuario=None, referencia=''):
+        '''
+            Aplica la recepción en una transacción. Solo debe llamarse si
+            es válida.
+        '''
+        return ajustar_lote(
+            dict(self.deltas),
+            tipo='entrada',
+            usuario=usuario,
+            motivo=MOTIVO,
+            movimientos=[
+                (id, cantidad, ref or referencia)
+                for (id, ref), cantidad in sorted(self.por_referencia.items())
+            ]
+        )
+
+
+def indice_productos():
+    '''
+        Devuelve ({slug: id}, ids) de todos los productos en una consulta.
+        El slug no es único: los repetidos se guardan como None y se exige
+        usar el id.
+    '''
+    indice = {}
+    ids = set()
+    for slug, id in Producto.objects.values_list('slug', 'id').iterator():
+        indice[slug] = None if slug in indice else id
+        ids.add(id)
+    return indice, ids
+
+
+def leer_recepcion(lineas):
+    '''
+        Valida las líneas de texto de un CSV (un archivo abierto en modo
+        texto o cualquier iterable de líneas) y devuelve una Recepcion.
+    '''
+    recepcion = Recepcion()
+    lector = csv.DictReader(lineas)
+    columnas = {c.strip().lower() for c in lector.fieldnames or []}
+    if not {'producto', 'cantidad'} <= columnas:
+        recepcion.error(1, 'La cabecera debe incluir producto y cantidad.')
+        return recepcion
+    indice, ids = indice_productos()
+    for fila in lector:
+        recepcion.lineas += 1
+        fila = {
+            (clave or '').strip().lower(): (valor or '').strip()
+            for clave, valor in fila.items()
+            if isinstance(valor, str) or valor is None
+        }
+        numero = lector.line_num
+        producto = fila.get('producto', '')
+        if producto.isdigit() and int(producto) in ids:
+            id_producto = int(producto)
+        elif producto in indice:
+            id_producto = indice[producto]
+            if id_producto is None:
+                recepcion.error(
+                    numero, f'El slug "{producto}" es ambiguo: usa el id.'
+                )
+                continue
+        else:
+            recepcion.error(numero, f'Producto desconocido: "{producto}".')
+            continue
+        try:
+            cantidad = int(fila.get('cantidad', ''))
+        except ValueError:
+            recepcion.error(numero, f'Cantidad no válida: "{fila.get("cantidad")}".')
+            continue
+        if cantidad <= 0:
+            recepcion.error(numero, 'La cantidad debe ser mayor que cero.')
+            continue
+        recepcion.deltas[id_producto] += cantidad
+        referencia = fila.get('referencia', '')[:50]
+        recepcion.por_referencia[(id_producto, referencia)] += cantidad
+    if not recepcion.lineas and not recepcion.total_errores:
+        recepcion.error(1, 'El archivo no contiene líneas.')
+    return recepcion
@@ -1,65 +1,323 @@
+from collections import Counter, defaultdict
+import hashlib
+import uuid
 import redis
 from django.conf import settings
 from .models import Producto
+from .respaldo import Cortocircuito, TablaRespaldo
 
-# Conectar a redis
+# Conectar a redis. Las peticiones web usan un pool con timeouts cortos para
+# que un Redis lento no bloquee las páginas de producto y del carro.
 r = redis.Redis(
+    connection_pool=redis.ConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        socket_timeout=settings.RECOMENDADOR_TIMEOUT,
+        socket_connect_timeout=settings.RECOMENDADOR_TIMEOUT,
+        max_connections=settings.RECOMENDADOR_MAX_CONEXIONES,
+    )
+)
+
+# Las escrituras (registrar_compra) usan su propio cliente con un timeout
+# normal: si una transacción se corta después de que Redis la haya
+# ejecutado, el reintento de la tarea contaría dos veces la misma compra.
+r_escritura = redis.Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
-    db=settings.REDIS_DB
+    db=settings.REDIS_DB,
+    socket_timeout=settings.RECOMENDADOR_TIMEOUT_ESCRITURA,
+    socket_connect_timeout=settings.RECOMENDADOR_TIMEOUT_ESCRITURA,
+)
+
+# Estado compartido por todas las peticiones del proceso.
+circuito = Cortocircuito(
+    settings.RECOMENDADOR_FALLOS_MAXIMOS, settings.RECOMENDADOR_REINTENTO
 )
+tabla_respaldo = TablaRespaldo()
+
+
+def conexion_sin_timeout():
+    '''
+        Cliente para procesos por lotes (reconstrucción, cargas masivas) que
+        no deben cortarse por los timeouts de las peticiones web.
+    '''
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB
+    )
+
+# Incrementarla invalida todas las sugerencias cacheadas.
+CLAVE_VERSION_GLOBAL = 'recomendador:version'
+PATRON_CLAVES = 'producto:*:comprado_con'
+
 
 class Recomendador:
+    def __init__(self, cliente=None):
+        # cliente sustituye a los dos: las lecturas y las escrituras.
+        self.r = cliente or r
+        self.r_escritura = cliente or r_escritura
+
     def obtener_clave_producto(self, id):
         return f'producto:{id}:comprado_con'
 
+    def obtener_clave_version(self, id):
+        return f'producto:{id}:version'
+
+    def obtener_ids(self, productos):
+        '''
+            Ids (sin repetir) de una cesta. Acepta una Orden (usa sus items,
+            conviene hacer prefetch_related('items')), instancias de Producto
+            o ids directamente.
+        '''
+        if hasattr(productos, 'items') and hasattr(productos.items, 'all'):
+            productos = [item.producto_id for item in productos.items.all()]
+        ids = (p.id if hasattr(p, 'id') else int(p) for p in productos)
+        return list(dict.fromkeys(ids))
+
+    def contar_compras_conjuntas(self, cestas, incrementos=None):
+        '''
+            Acumula en un Counter {(id_producto, con_id): veces} los pares
+            de productos comprados juntos en cada cesta.
+        '''
+        incrementos = Counter() if incrementos is None else incrementos
+        for cesta in cestas:
+            ids_productos = self.obtener_ids(cesta)
+            for id_producto in ids_productos:
+                for con_id in ids_productos:
+                    if id_producto != con_id:
+                        incrementos[(id_producto, con_id)] += 1
+        return incrementos
+
+    def registrar_incrementos(self, incrementos):
+        '''
+            Aplica todos los incrementos en un único pipeline transaccional:
+            un solo viaje de ida y vuelta a Redis sea cual sea el tamaño.
+        '''
+        if not incrementos:
+            return
+        with self.r_escritura.pipeline(transaction=True) as pipe:
+            for (id_producto, con_id), cantidad in incrementos.items():
+                pipe.zincrby(
+                    self.obtener_clave_producto(id_producto), cantidad, con_id
+                )
+            # Invalida las sugerencias cacheadas de los productos modificados
+            for id_producto in {id for id, _ in incrementos}:
+                pipe.incr(self.obtener_clave_version(id_producto))
+            pipe.execute()
+
     def productos_comprados(self, productos):
-        # Obtenemos el id de los objetos producto.
-        ids_productos = [p.id for p in productos]
-        # Iteramos la lista de ids.
-        for id_producto in ids_productos:
-            # Iteramos otra vez para luego evitar el mismo id.
-            for con_id in ids_productos:
-                # Obtiene los demás productos comprados con cada producto.
-                if id_producto != con_id:
-                    # Incrementa la putuación por producto comprado en conjunto
-                    r.zincrby(
-                        self.obtener_clave_producto(id_producto), 1, con_id
-                    )
+        # Incrementa la puntuación de cada par de productos comprados juntos.
+        self.registrar_incrementos(self.contar_compras_conjuntas([productos]))
+
+    def productos_comprados_bulk(self, ordenes, tamanio_lote=500):
+        '''
+            Versión por lotes de productos_comprados para cargas masivas.
+            ordenes es un iterable de cestas (Orden, productos o ids). Los
+            incrementos de cada lote de tamanio_lote órdenes se agrupan y se
+            envían en un solo pipeline. Devuelve el número de órdenes leídas.
+        '''
+        incrementos = Counter()
+        total = 0
+        for total, orden in enumerate(ordenes, start=1):
+            self.contar_compras_conjuntas([orden], incrementos)
+            if total % tamanio_lote == 0:
+                self.registrar_incrementos(incrementos)
+                incrementos.clear()
+        self.registrar_incrementos(incrementos)
+        return total
 
     def sugerencias_para(self, productos, max_results=6):
-        # Obtenemos el id de los objetos producto.
-        ids_productos = [p.id for p in productos]
-        if len(productos) == 1:
-            sugerencias = r.zrange(
-                self.obtener_clave_producto(ids_productos[0]), 0, -1, desc=True
-            )[:max_results]
+        '''
+            Devuelve hasta max_results productos comprados junto con los
+            productos dados, ordenados por puntuación.
+            La lista de ids sugeridos se cachea en Redis con la versión de
+            cada producto implicado, que productos_comprados incrementa al
+            modificar su sorted set.
+            Si Redis falla o el circuito está abierto se usa la tabla de
+            respaldo en memoria (ver respaldo.py).
+        '''
+        ids_productos = self.obtener_ids(productos)
+        if not ids_productos:
+            return []
+        ids_productos_sugeridos = None
+        if circuito.permite():
+            try:
+                ids_productos_sugeridos = self.sugerencias_redis(
+                    ids_productos, max_results
+                )
+                circuito.registrar_exito()
+            except redis.RedisError:
+                circuito.registrar_fallo()
+        if ids_productos_sugeridos is None:
+            ids_categorias = {
+                p.categoria_id for p in productos if hasattr(p, 'categoria_id')
+            }
+            ids_productos_sugeridos = tabla_respaldo.sugerencias(
+                ids_productos, ids_categorias, max_results
+            )
+        # Obtener los productos sugeridos por orden de aparición
+        productos_sugeridos = Producto.objects.in_bulk(ids_productos_sugeridos)
+        return [
+            productos_sugeridos[id]
+            for id in ids_productos_sugeridos
+            if id in productos_sugeridos
+        ]
+
+    def sugerencias_redis(self, ids_productos, max_results):
+        clave_cache = self.obtener_clave_cache(ids_productos, max_results)
+        en_cache = self.r.get(clave_cache)
+        if en_cache is not None:
+            return [int(id) for id in en_cache.split(b',') if id]
+        ids_productos_sugeridos = self.calcular_sugerencias(
+            ids_productos, max_results
+        )
+        self.r.set(
+            clave_cache,
+            ','.join(str(id) for id in ids_productos_sugeridos),
+            ex=settings.RECOMENDADOR_CACHE_TTL
+        )
+        return ids_productos_sugeridos
+
+    def calcular_sugerencias(self, ids_productos, max_results):
+        '''
+            Pide a Redis solo los max_results mejores ids.
+        '''
+        if len(ids_productos) == 1:
+            sugerencias = self.r.zrange(
+                self.obtener_clave_producto(ids_productos[0]),
+                0, max_results - 1, desc=True
+            )
         else:
-            # Generar clave temporal construída con los ids de los productos
-            ids_planos = ''.join([str(id) for id in ids_productos])
-            clave_temp = f'tmp_{ids_planos}'
-            # Multiles productos, combinar puntuaciones de todos los productos
-            # Alamacenar el sorted set resultante en una clave temporal
+            # Varios productos: combinar las puntuaciones de todos en una
+            # clave temporal derivada de los ids ordenados, de modo que cada
+            # cesta tiene su propia clave. Todo va en una transacción, así
+            # que peticiones simultáneas de la misma cesta no se pisan.
+            clave_temp = f'tmp:sugerencias:{self.obtener_firma(ids_productos)}'
             claves = [self.obtener_clave_producto(id) for id in ids_productos]
-            r.zunionstore(clave_temp, claves)
-            # Eliminar ids de los productos para los que se recomienda
-            r.zrem(clave_temp, *ids_productos)
-            # Obtener los ids por su puntuación, en orden descendente
-            sugerencias = r.zrange(
-                clave_temp, 0, -1, desc=True
-            )[:max_results]
-            # Eliminar la clave temporal
-            r.delete(clave_temp)
-        ids_productos_sugeridos = [int(id) for id in sugerencias]
-        # Obtener los productos sugeridos por orden de aparición
-        productos_sugeridos = list(
-            Producto.objects.filter(id__in=ids_productos_sugeridos)
+            with self.r.pipeline(transaction=True) as pipe:
+                pipe.zunionstore(clave_temp, claves)
+                # Eliminar ids de los productos para los que se recomienda
+                pipe.zrem(clave_temp, *ids_productos)
+                pipe.zrange(clave_temp, 0, max_results - 1, desc=True)
+                pipe.delete(clave_temp)
+                sugerencias = pipe.execute()[2]
+        return [int(id) for id in sugerencias]
+
+    def obtener_firma(self, ids_productos):
+        ids_ordenados = ','.join(str(id) for id in sorted(ids_productos))
+        return hashlib.sha1(ids_ordenados.encode()).hexdigest()
+
+    def obtener_clave_cache(self, ids_productos, max_results):
+        '''
+            Clave de la caché de sugerencias para una cesta. Incluye la versión
+            global y la de cada producto, así que cambia (invalidando la
+            entrada anterior) cuando se actualiza cualquiera de sus claves.
+        '''
+        claves_version = [CLAVE_VERSION_GLOBAL] + [
+            self.obtener_clave_version(id) for id in ids_productos
+        ]
+        versiones = ','.join(
+            (version or b'0').decode() for version in self.r.mget(claves_version)
         )
-        productos_sugeridos.sort(
-            key=lambda x: ids_productos_sugeridos.index(x.id)
+        firma = self.obtener_firma(ids_productos)
+        return f'sugerencias:{firma}:{max_results}:{versiones}'
+
+    def limpiar_compras(self, tamanio_lote=1000):
+        '''
+            Elimina todo el modelo de compras conjuntas recorriendo las claves
+            con SCAN y borrándolas por lotes con UNLINK.
+        '''
+        lote = []
+        for clave in self.r_escritura.scan_iter(
+            match=PATRON_CLAVES, count=tamanio_lote
+        ):
+            lote.append(clave)
+            if len(lote) >= tamanio_lote:
+                self.r_escritura.unlink(*lote)
+                lote = []
+        if lote:
+            self.r_escritura.unlink(*lote)
+        self.r_escritura.incr(CLAVE_VERSION_GLOBAL)
+
+    def reconstruir(self, cestas, max_pares=500_000, tamanio_pipeline=1000):
+        '''
+            Reconstruye el modelo completo a partir de un iterable de cestas
+            (ver productos_comprados_bulk) sin tocar las claves en uso.
+
+            Los pares se cuentan en memoria y, cada vez que hay más de
+            max_pares distintos, se vuelcan con ZADD a un espacio de claves
+            en sombra, así que la memoria usada está acotada. Al final las
+            claves en sombra sustituyen a las actuales en una sola
+            transacción. Devuelve un dict con estadísticas.
+        '''
+        prefijo = f'reconstruccion:{uuid.uuid4().hex}:'
+        volcados = set()
+        incrementos = Counter()
+        estadisticas = {'cestas': 0, 'volcados': 0}
+        for cesta in cestas:
+            self.contar_compras_conjuntas([cesta], incrementos)
+            estadisticas['cestas'] += 1
+            if len(incrementos) >= max_pares:
+                self.volcar_en_sombra(
+                    prefijo, incrementos, volcados, tamanio_pipeline
+                )
+                estadisticas['volcados'] += 1
+                incrementos.clear()
+        if incrementos:
+            self.volcar_en_sombra(
+                prefijo, incrementos, volcados, tamanio_pipeline
+            )
+            estadisticas['volcados'] += 1
+        estadisticas['productos'] = len(volcados)
+        estadisticas['eliminadas'] = self.intercambiar_sombra(
+            prefijo, volcados
         )
-        return productos_sugeridos
+        return estadisticas
+
+    def volcar_en_sombra(self, prefijo, incrementos, volcados, tamanio_pipeline):
+        '''
+            Carga los incrementos en las claves en sombra con un ZADD por
+            producto. Si la clave ya recibió un volcado anterior, se carga en
+            una clave auxiliar y se suma con ZUNIONSTORE.
+        '''
+        por_producto = defaultdict(dict)
+        for (id_producto, con_id), cantidad in incrementos.items():
+            por_producto[id_producto][con_id] = cantidad
+        pipe = self.r_escritura.pipeline(transaction=False)
+        for i, (id_producto, puntuaciones) in enumerate(por_producto.items(), 1):
+            clave = prefijo + self.obtener_clave_producto(id_producto)
+            if id_producto in volcados:
+                clave_aux = f'{clave}:aux'
+                pipe.zadd(clave_aux, puntuaciones)
+                pipe.zunionstore(clave, [clave, clave_aux])
+                pipe.delete(clave_aux)
+            else:
+                pipe.zadd(clave, puntuaciones)
+                volcados.add(id_producto)
+            if i % tamanio_pipeline == 0:
+                pipe.execute()
+        pipe.execute()
 
-    def limpiar_compras(self):
-        for id in Producto.objects.values_list('id', flat=True):
-            r.delete(self.obtener_clave_producto(id))
+    def intercambiar_sombra(self, prefijo, ids_productos):
+        '''
+            Sustituye atómicamente el modelo actual por las claves en sombra
+            y elimina las claves de productos que ya no tienen compras.
+            Devuelve cuántas claves obsoletas se han eliminado.
+        '''
+        claves_nuevas = {self.obtener_clave_producto(id) for id in ids_productos}
+        obsoletas = [
+            clave for clave in self.r_escritura.scan_iter(
+                match=PATRON_CLAVES, count=1000
+            )
+            if clave.decode() not in claves_nuevas
+        ]
+        with self.r_escritura.pipeline(transaction=True) as pipe:
+            if obsoletas:
+                pipe.unlink(*obsoletas)
+            for clave in claves_nuevas:
+                pipe.rename(prefijo + clave, clave)
+            pipe.incr(CLAVE_VERSION_GLOBAL)
+            pipe.execute()
+        return len(obsoletas)
@@ -0,0 +1,167 @@
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain, groupby
+from operator import itemgetter
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+
+class Cortocircuito:
+    '''
+        Circuit breaker para las lecturas del recomendador.
+
+        Tras fallos_maximos errores seguidos el circuito se abre y durante
+        tiempo_reintento segundos no se intenta contactar con Redis. Pasado
+        ese tiempo se deja pasar una petición de prueba: si funciona el
+        circuito se cierra, si falla se vuelve a abrir.
+    '''
+
+    def __init__(self, fallos_maximos, tiempo_reintento):
+        self.fallos_maximos = fallos_maximos
+        self.tiempo_reintento = tiempo_reintento
+        self.fallos = 0
+        self.abierto_hasta = 0
+        self.lock = threading.Lock()
+
+    def permite(self):
+        with self.lock:
+            if self.fallos < self.fallos_maximos:
+                return True
+            if time.monotonic() >= self.abierto_hasta:
+                # Semiabierto: una sola petición de prueba por intervalo.
+                self.abierto_hasta = time.monotonic() + self.tiempo_reintento
+                return True
+            return False
+
+    def registrar_exito(self):
+        with self.lock:
+            self.fallos = 0
+
+    def registrar_fallo(self):
+        with self.lock:
+            self.fallos += 1
+            if self.fallos >= self.fallos_maximos:
+                self.abierto_hasta = time.monotonic() + self.tiempo_reintento
+
+
+class TablaRespaldo:
+    '''
+        Tabla en memoria del proceso con los productos más comprados junto a
+        cada producto (un array de ids por producto) y los más vendidos de
+        cada categoría. Se calcula desde las órdenes pagadas de los últimos
+        RECOMENDADOR_RESPALDO_DIAS días y se usa cuando Redis no responde.
+
+        La tabla se refresca en un hilo en segundo plano cuando caduca, así
+        que las peticiones nunca esperan a su cálculo: mientras no existe
+        simplemente no hay sugerencias. Solo hay un refresco en curso a la
+        vez y, si falla, no se reintenta hasta pasados
+        RECOMENDADOR_RESPALDO_REINTENTO segundos.
+    '''
+
+    def __init__(self):
+        self.tabla = {}
+        self.mas_vendidos = {}
+        self.actualizada = None
+        self.lock = threading.Lock()
+        self.refrescando = False
+        self.reintentar_desde = 0
+
+    def refrescar_si_caduca(self):
+        ahora = time.monotonic()
+        caducada = (
+            self.actualizada is None
+            or ahora - self.actualizada > settings.RECOMENDADOR_RESPALDO_TTL
+        )
+        with self.lock:
+            if not caducada or self.refrescando or ahora < self.reintentar_desde:
+                return
+            self.refrescando = True
+            self.reintentar_desde = (
+                ahora + settings.RECOMENDADOR_RESPALDO_REINTENTO
+            )
+        threading.Thread(target=self.refrescar, daemon=True).start()
+
+    def refrescar(self):
+        from ordenes.models import ItemOrden
+        from .recomendador import Recomendador
+        try:
+            desde = timezone.now() - timedelta(
+                days=settings.RECOMENDADOR_RESPALDO_DIAS
+            )
+            filas = (
+                ItemOrden.objects.filter(
+                    orden__pagado=True, orden__creado__gte=desde
+                )
+                .order_by('orden_id')
+                .values_list(
+                    'orden_id', 'producto_id', 'producto__categoria_id',
+                    'cantidad'
+                )
+                .iterator(chunk_size=5000)
+            )
+            recomendador = Recomendador()
+            pares = Counter()
+            ventas = defaultdict(Counter)
+            for _, items in groupby(filas, key=itemgetter(0)):
+                cesta = []
+                for _, id_producto, id_categoria, cantidad in items:
+                    ventas[id_categoria][id_producto] += cantidad
+                    cesta.append(id_producto)
+                recomendador.contar_compras_conjuntas([cesta], pares)
+            top = settings.RECOMENDADOR_RESPALDO_TOP
+            por_producto = defaultdict(list)
+            for (id_producto, con_id), veces in pares.items():
+                por_producto[id_producto].append((veces, con_id))
+            del pares
+            tabla = {
+                id_producto: array('q', (
+                    con_id for _, con_id in heapq.nlargest(top, candidatos)
+                ))
+                for id_producto, candidatos in por_producto.items()
+            }
+            mas_vendidos = {
+                id_categoria: array('q', (
+                    id_producto for id_producto, _ in contador.most_common(top)
+                ))
+                for id_categoria, contador in ventas.items()
+            }
+            # Sustitución de referencias: los lectores ven la tabla antigua
+            # o la nueva, nunca una a medio construir.
+            self.tabla, self.mas_vendidos = tabla, mas_vendidos
+            self.actualizada = time.monotonic()
+        finally:
+            self.refrescando = False
+            connection.close()
+
+    def sugerencias(self, ids_productos, ids_categorias, max_results):
+        '''
+            Combina por turnos las listas de los productos de la cesta y
+            completa con los más vendidos de sus categorías.
+        '''
+        self.refrescar_si_caduca()
+        excluidos = set(ids_productos)
+        candidatos = chain(
+            self.intercalar([self.tabla.get(id, ()) for id in ids_productos]),
+            self.intercalar(
+                [self.mas_vendidos.get(id, ()) for id in ids_categorias]
+            ),
+        )
+        sugerencias = []
+        for id in candidatos:
+            if id not in excluidos:
+                excluidos.add(id)
+                sugerencias.append(id)
+                if len(sugerencias) == max_results:
+                    break
+        return sugerencias
+
+    def intercalar(self, listas):
+        for posicion in range(settings.RECOMENDADOR_RESPALDO_TOP):
+            for lista in listas:
+                if posicion < len(lista):
+                    yield lista[posicion]
@@ -0,0 +1,51 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .cache import invalidar_categoria, invalidar_inventario, invalidar_producto
+from .models import Categoria, Producto, Proveedor
+
+
+@receiver(pre_save, sender=Producto)
+def recordar_categoria_anterior(sender, instance, update_fields=None, **kwargs):
+    '''
+        Guarda la categoría previa del producto para invalidar también su
+        listado si el producto cambia de categoría.
+    '''
+    instance._id_categoria_anterior = None
+    if instance.pk and (update_fields is None or 'categoria' in update_fields):
+        instance._id_categoria_anterior = (
+            Producto.objects.filter(pk=instance.pk)
+            .values_list('categoria_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_cache_producto(sender, instance, **kwargs):
+    # Los ajustes de stock (stock.py) usan UPDATE y no pasan por aquí: el
+    # stock no forma parte de los fragmentos cacheados, y stock.py invalida
+    # por su cuenta las métricas de inventario.
+    # Las versiones se incrementan al confirmar la transacción: si se hiciera
+    # antes, una petición simultánea podría cachear la fila antigua con la
+    # versión nueva. Se copia el producto porque tras un borrado Django deja
+    # su pk a None.
+    producto = Producto(id=instance.pk, categoria_id=instance.categoria_id)
+    transaction.on_commit(partial(
+        invalidar_producto,
+        producto, getattr(instance, '_id_categoria_anterior', None)
+    ))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_categoria(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidar_categoria, instance))
+
+
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def invalidar_cache_proveedor(sender, instance, **kwargs):
+    # Las métricas de los dashboards se agrupan por nombre de proveedor.
+    transaction.on_commit(invalidar_inventario)
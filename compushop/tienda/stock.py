@@ -0,0 +1,164 @@
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from .cache import invalidar_inventario
+from .models import Producto, StockMovimiento
+
+
+'''
+    Servicio de stock.
+
+    Todos los cambios de stock pasan por aquí: se aplican con un UPDATE
+    condicional (el stock nunca queda negativo) y el StockMovimiento se crea
+    en la misma transacción, así que no puede haber cambios sin registrar.
+
+    Los UPDATE no envían señales: como el stock no aparece en las tarjetas
+    ni en el listado del catálogo, no es necesario invalidar su caché.
+'''
+
+
+class StockInsuficiente(Exception):
+    '''
+        Algún ajuste dejaría el stock en negativo (o el producto no existe).
+        ids contiene los productos afectados; no se ha aplicado ningún cambio.
+    '''
+    def __init__(self, ids):
+        self.ids = ids
+        super().__init__(', '.join(str(id) for id in ids))
+
+
+def admite_returning():
+    # UPDATE ... RETURNING: PostgreSQL, SQLite >= 3.35 y MariaDB >= 10.5.
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'mysql' and connection.mysql_is_mariadb \
+        and connection.mysql_version >= (10, 5)
+
+
+def actualizar_stock(id_producto, delta):
+    '''
+        Suma delta al stock si no queda negativo y devuelve el nuevo stock,
+        o None si no se ha podido aplicar.
+    '''
+    if admite_returning():
+        tabla = connection.ops.quote_name(Producto._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {tabla} SET stock = stock + %s '
+                f'WHERE id = %s AND stock + %s >= 0 RETURNING stock',
+                [delta, id_producto, delta]
+            )
+            fila = cursor.fetchone()
+        return fila[0] if fila else None
+    actualizado = Producto.objects.filter(
+        id=id_producto, stock__gte=-delta
+    ).update(stock=F('stock') + delta)
+    if not actualizado:
+        return None
+    return Producto.objects.filter(id=id_producto).values_list(
+        'stock', flat=True
+    ).first()
+
+
+def ajustar(id_producto, delta, tipo='ajuste', usuario=None, motivo='',
+            referencia='', invalidar_metricas=True):
+    '''
+        Ajusta el stock de un producto y registra el movimiento. Devuelve el
+        stock resultante o lanza StockInsuficiente.
+        invalidar_metricas: ver ajustar_lote.
+    '''
+    with transaction.atomic():
+        stock = actualizar_stock(id_producto, delta)
+        if stock is None:
+            raise StockInsuficiente([id_producto])
+        StockMovimiento.objects.create(
+            producto_id=id_producto,
+            tipo=tipo,
+            cantidad=delta,
+            motivo=motivo,
+            usuario=usuario,
+            referencia=referencia
+        )
+        if invalidar_metricas:
+            transaction.on_commit(invalidar_inventario)
+    return stock
+
+
+class LoteRechazado(Exception):
+    pass
+
+
+def ajustar_lote(deltas, tipo='ajuste', usuario=None, motivo='',
+                 referencia='', tamanio_lote=500, movimientos=None,
+                 invalidar_metricas=True):
+    '''
+        Aplica {id_producto: delta} con un UPDATE por cada tamanio_lote
+        productos y registra los movimientos con bulk_create, todo en una
+        transacción: o se aplican todos los ajustes o ninguno.
+
+        Por defecto se registra un movimiento por producto. movimientos
+        permite indicar otro desglose como [(id_producto, cantidad,
+        referencia)], por ejemplo uno por albarán; la suma por producto debe
+        coincidir con deltas.
+
+        Los productos se actualizan en orden de id para que dos lotes
+        concurrentes no se bloqueen mutuamente.
+
+        Los ajustes del personal (almacén, recepciones) invalidan la
+        instantánea de métricas de los dashboards. Las reservas de los
+        checkouts pasan invalidar_metricas=False: con ventas continuas la
+        invalidarían a cada momento, y basta con que caduque por
+        METRICAS_CACHE_TIMEOUT.
+    '''
+    ids = sorted(id for id, delta in deltas.items() if delta)
+    with transaction.atomic():
+        for inicio in range(0, len(ids), tamanio_lote):
+            bloque = ids[inicio:inicio + tamanio_lote]
+            # Cada producto solo se actualiza si su stock cubre el delta.
+            condicion = Q()
+            for id in bloque:
+                if deltas[id] < 0:
+                    condicion |= Q(id=id, stock__gte=-deltas[id])
+                else:
+                    condicion |= Q(id=id)
+            try:
+                with transaction.atomic():
+                    actualizados = Producto.objects.filter(condicion).update(
+                        stock=F('stock') + Case(
+                            *[When(id=id, then=Value(deltas[id]))
+                              for id in bloque],
+                            output_field=IntegerField()
+                        )
+                    )
+                    if actualizados != len(bloque):
+                        raise LoteRechazado()
+            except LoteRechazado:
+                # Deshecho el bloque, el stock actual indica qué falló.
+                stocks = dict(
+                    Producto.objects.filter(id__in=bloque)
+                    .values_list('id', 'stock')
+                )
+                raise StockInsuficiente([
+                    id for id in bloque
+                    if id not in stocks or stocks[id] + deltas[id] < 0
+                ])
+        if movimientos is None:
+            movimientos = [(id, deltas[id], referencia) for id in ids]
+        StockMovimiento.objects.bulk_create(
+            [
+                StockMovimiento(
+                    producto_id=id,
+                    tipo=tipo,
+                    cantidad=cantidad,
+                    motivo=motivo,
+                    usuario=usuario,
+                    referencia=referencia_movimiento
+                )
+                for id, cantidad, referencia_movimiento in movimientos
+            ],
+            batch_size=tamanio_lote
+        )
+        if invalidar_metricas:
+            transaction.on_commit(invalidar_inventario)
+    return len(ids)
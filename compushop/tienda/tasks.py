@@ -0,0 +1,14 @@
+import datetime
+from celery import shared_task
+
+
+@shared_task
+def tomar_snapshot_stock(fecha=None):
+    '''
+    Foto diaria del stock de todos los productos (ver historico.py). La
+    programa CELERY_BEAT_SCHEDULE poco después de medianoche.
+    '''
+    from .historico import tomar_snapshot
+    if fecha:
+        fecha = datetime.date.fromisoformat(fecha)
+    return tomar_snapshot(fecha)
@@ -1,3 +1,154 @@
+from decimal import Decimal
 from django.test import TestCase
+from .cache import clave_version_producto, obtener_version
+from .models import Categoria, Producto, Proveedor, StockMovimiento
+from .paginacion import (
+    codificar_cursor, decodificar_cursor, paginar_por_cursor
+)
+from .stock import StockInsuficiente, ajustar, ajustar_lote
 
-# Create your tests here.
+
+def crear_producto(nombre, stock=0, categoria=None, proveedor=None):
+    categoria = categoria or Categoria.objects.get_or_create(
+        slug='componentes', defaults={'nombre': 'Componentes'}
+    )[0]
+    proveedor = proveedor or Proveedor.objects.get_or_create(
+        cif='B00000000',
+        defaults={'nombre_empresa': 'Proveedor', 'telefono': '600000000'}
+    )[0]
+    return Producto.objects.create(
+        categoria=categoria,
+        proveedor=proveedor,
+        nombre=nombre,
+        slug=nombre.lower().replace(' ', '-'),
+        precio=Decimal('10.00'),
+        stock=stock
+    )
+
+
+class AjustarStockTests(TestCase):
+    def setUp(self):
+        self.ram = crear_producto('RAM', stock=5)
+        self.ssd = crear_producto('SSD', stock=2)
+        self.cpu = crear_producto('CPU', stock=10)
+
+    def stock(self, producto):
+        producto.refresh_from_db(fields=['stock'])
+        return producto.stock
+
+    def test_ajustar_no_deja_stock_negativo(self):
+        with self.assertRaises(StockInsuficiente) as error:
+            ajustar(self.ssd.id, -3)
+        self.assertEqual(error.exception.ids, [self.ssd.id])
+        self.assertEqual(self.stock(self.ssd), 2)
+        self.assertFalse(StockMovimiento.objects.exists())
+
+    def test_ajustar_registra_movimiento(self):
+        self.assertEqual(ajustar(self.ram.id, -5, tipo='salida'), 0)
+        movimiento = StockMovimiento.objects.get()
+        self.assertEqual(
+            (movimiento.producto_id, movimiento.tipo, movimiento.cantidad),
+            (self.ram.id, 'salida', -5)
+        )
+
+    def test_lote_que_dejaria_stock_negativo_no_aplica_nada(self):
+        deltas = {self.ram.id: -1, self.ssd.id: -3, self.cpu.id: 4}
+        with self.assertRaises(StockInsuficiente) as error:
+            ajustar_lote(deltas)
+        self.assertEqual(error.exception.ids, [self.ssd.id])
+        self.assertEqual(
+            [self.stock(p) for p in (self.ram, self.ssd, self.cpu)],
+            [5, 2, 10]
+        )
+        self.assertFalse(StockMovimiento.objects.exists())
+
+    def test_lote_rechazado_deshace_los_bloques_anteriores(self):
+        # Con bloques de un producto el de RAM ya se ha actualizado cuando
+        # falla el de SSD.
+        deltas = {self.ram.id: -1, self.ssd.id: -3}
+        with self.assertRaises(StockInsuficiente):
+            ajustar_lote(deltas, tamanio_lote=1)
+        self.assertEqual(self.stock(self.ram), 5)
+        self.assertEqual(self.stock(self.ssd), 2)
+
+    def test_lote_con_producto_inexistente(self):
+        with self.assertRaises(StockInsuficiente) as error:
+            ajustar_lote({self.ram.id: -1, 999999: 1})
+        self.assertEqual(error.exception.ids, [999999])
+        self.assertEqual(self.stock(self.ram), 5)
+
+    def test_lote_valido(self):
+        deltas = {self.ram.id: -5, self.ssd.id: -2, self.cpu.id: 3}
+        self.assertEqual(ajustar_lote(deltas, tipo='salida'), 3)
+        self.assertEqual(
+            [self.stock(p) for p in (self.ram, self.ssd, self.cpu)],
+            [0, 0, 13]
+        )
+        self.assertEqual(
+            dict(StockMovimiento.objects.values_list('producto_id', 'cantidad')),
+            deltas
+        )
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        # Nombres repetidos para comprobar el desempate por id.
+        self.productos = [
+            crear_producto(nombre)
+            for nombre in ['Ratón', 'Monitor', 'Ratón', 'Teclado', 'Altavoz',
+                           'Monitor', 'Ñandú', 'Cable "USB"']
+        ]
+
+    def test_cursor_ida_y_vuelta(self):
+        for producto in self.productos:
+            self.assertEqual(
+                decodificar_cursor(codificar_cursor(producto)),
+                (producto.nombre, producto.id)
+            )
+
+    def test_cursor_invalido(self):
+        for cursor in ['', 'no-es-base64!', 'bm8tanNvbg', codificar_cursor(
+                Producto(nombre='x', id=1))[:-2]]:
+            self.assertIsNone(decodificar_cursor(cursor))
+
+    def test_recorre_todos_los_productos_sin_repetir(self):
+        productos = Producto.objects.all()
+        recorridos, cursor = [], None
+        while True:
+            pagina, cursor = paginar_por_cursor(productos, cursor, por_pagina=3)
+            self.assertLessEqual(len(pagina), 3)
+            recorridos.extend(pagina)
+            if cursor is None:
+                break
+        self.assertEqual(
+            recorridos, list(productos.order_by('nombre', 'id'))
+        )
+
+    def test_ultima_pagina_exacta_no_tiene_siguiente(self):
+        pagina, cursor = paginar_por_cursor(
+            Producto.objects.all(), por_pagina=len(self.productos)
+        )
+        self.assertEqual(len(pagina), len(self.productos))
+        self.assertIsNone(cursor)
+
+
+class InvalidacionCacheTests(TestCase):
+    def test_version_cambia_al_confirmar(self):
+        producto = crear_producto('GPU')
+        clave = clave_version_producto(producto.id)
+        version = obtener_version(clave)
+        with self.captureOnCommitCallbacks() as callbacks:
+            producto.precio = Decimal('20.00')
+            producto.save()
+            self.assertEqual(obtener_version(clave), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(obtener_version(clave), version)
+
+    def test_borrado_invalida_el_producto(self):
+        producto = crear_producto('GPU')
+        clave = clave_version_producto(producto.id)
+        version = obtener_version(clave)
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.delete()
+        self.assertNotEqual(obtener_version(clave), version)
@@ -7,4 +7,5 @@ urlpatterns = [
     path('inventario/', v.inventario_list, name='inventario'),
     path('inventario/<int:pk>/ajustar/', v.ajustar_stock, name='ajustar'),
     path('movimientos/', v.movimientos_list, name='movimientos'),
+    path('recepcion/', v.recepcion_stock, name='recepcion'),
 ]
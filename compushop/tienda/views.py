@@ -1,31 +1,86 @@
+import hashlib
 from django.shortcuts import get_object_or_404, render
+from django.utils import translation
 from .models import Categoria, Producto
 from carro.forms import FormularioAniadir
 from .recomendador import Recomendador
-from .models import Categoria, Producto
+from .paginacion import obtener_por_pagina, paginar_por_cursor
+from .cache import (
+    clave_version_listado,
+    con_respaldo,
+    obtener_o_generar,
+    obtener_version,
+    tarjetas_productos,
+)
 # from django.utils import translation  ->> Probar las traducciones.
 
 
+def render_listado(request, contexto, productos, id_categoria=None):
+    '''
+        Renderiza una página del listado paginada por cursor (?cursor=).
+        El grid de cada página se cachea con la versión del listado de la
+        categoría, de modo que solo se consulta la base de datos cuando algún
+        producto de esa categoría ha cambiado.
+        Añade al contexto el cursor y la URL de la siguiente página y la
+        expone también en la cabecera Link de la respuesta.
+    '''
+    cursor = request.GET.get('cursor') or ''
+    por_pagina = obtener_por_pagina(request)
+    firma_cursor = hashlib.md5(cursor.encode()).hexdigest()
+
+    def generar_grid():
+        pagina, siguiente_cursor = paginar_por_cursor(
+            productos, cursor=cursor, por_pagina=por_pagina
+        )
+        return {
+            'html': ''.join(tarjetas_productos(pagina)),
+            'siguiente_cursor': siguiente_cursor,
+        }
+
+    def grid_cacheado():
+        version = obtener_version(clave_version_listado(id_categoria))
+        return obtener_o_generar(
+            f'catalogo:grid:{id_categoria or "todos"}:v{version}'
+            f':{translation.get_language()}:{por_pagina}:{firma_cursor}',
+            generar_grid
+        )
+
+    # Si Redis no responde la página se genera desde la base de datos.
+    grid = con_respaldo(grid_cacheado, generar_grid)
+    siguiente_cursor = grid['siguiente_cursor']
+    url_siguiente = None
+    if siguiente_cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = siguiente_cursor
+        url_siguiente = f'{request.path}?{parametros.urlencode()}'
+    contexto.update({
+        'grid_html': grid['html'],
+        'siguiente_cursor': siguiente_cursor,
+        'url_siguiente': url_siguiente,
+    })
+    respuesta = render(request, 'tienda/producto/lista.html', contexto)
+    if url_siguiente:
+        respuesta['Link'] = (
+            f'<{request.build_absolute_uri(url_siguiente)}>; rel="next"'
+        )
+    return respuesta
+
 
 # Vista para mostrar listado de productos
 def listado_productos(request, slug_categoria=None):
     # translation.activate('en')  ->> Solo para probar las traducciones.
     categoria = None
-    categorias = Categoria.objects.all()
     # Filtra la consulta para que devuelva solo los disponibles
     productos = Producto.objects.filter(disponible=True)
     # Parámetro opcional para filtrar según una categoria dada
     if slug_categoria:
         categoria = get_object_or_404(Categoria, slug=slug_categoria)
         productos = productos.filter(categoria=categoria)
-    return render(
+    return render_listado(
         request,
-        'tienda/producto/lista.html',
-        {
-            'categoria': categoria,
-            'categorias': categorias,
-            'productos': productos
-        }
+        {'categoria': categoria},
+        productos,
+        id_categoria=categoria.id if categoria else None
     )
 
 
@@ -50,11 +105,6 @@ def detalle_producto(request, id, slug):
 def productos_por_categoria(request, categoria_slug):
     categoria = get_object_or_404(Categoria, slug=categoria_slug)
     productos = Producto.objects.filter(categoria=categoria, disponible=True)
-    return render(
-        request,
-        'tienda/producto/lista.html',
-        {
-            'categoria': categoria,
-            'productos': productos
-        }
+    return render_listado(
+        request, {'categoria': categoria}, productos, id_categoria=categoria.id
     )
@@ -1,9 +1,17 @@
+import io
+from datetime import timedelta
+from django.core.paginator import Paginator
 from django.db.models import F, Q
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from cuentas.decorators import solo_rol
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.translation import gettext as _
 from .models import Producto
-from .forms import AjusteStockForm
+from .forms import AjusteStockForm, FiltroMovimientosForm, RecepcionStockForm
+from .historico import fin_del_dia
+from .recepcion import leer_recepcion
+from .stock import StockInsuficiente, ajustar
 
 @login_required
 @solo_rol('almacen', 'gerencia')
@@ -30,10 +38,15 @@ def ajustar_stock(request, pk):
             tipo = form.cleaned_data['tipo']
             cantidad = form.cleaned_data['cantidad']
             delta = cantidad if tipo == 'entrada' else (-cantidad if tipo == 'salida' else cantidad)
-            producto.ajustar_stock(delta, tipo=tipo, usuario=request.user,
-                                   motivo=form.cleaned_data.get('motivo',''),
-                                   referencia=form.cleaned_data.get('referencia',''))
-            return redirect('almacen:inventario')
+            try:
+                ajustar(producto.id, delta, tipo=tipo, usuario=request.user,
+                        motivo=form.cleaned_data.get('motivo',''),
+                        referencia=form.cleaned_data.get('referencia',''))
+            except StockInsuficiente:
+                producto.refresh_from_db(fields=['stock'])
+                form.add_error('cantidad', _('Stock insuficiente: quedan %(stock)s unidades.') % {'stock': producto.stock})
+            else:
+                return redirect('almacen:inventario')
     else:
         form = AjusteStockForm()
     return render(request, 'tienda/almacen_ajuste_form.html', {'producto': producto, 'form': form})
@@ -46,4 +59,44 @@ def movimientos_list(request):
     q = request.GET.get('q') or ''
     if q:
         movs = movs.filter(Q(producto__nombre__icontains=q) | Q(referencia__icontains=q) | Q(motivo__icontains=q))
-    return render(request, 'tienda/almacen_movimientos_list.html', {'movimientos': movs})
+    form = FiltroMovimientosForm(request.GET or None)
+    if form.is_valid():
+        # Los rangos de fechas y el tipo usan los índices (tipo, creado_en) y
+        # (producto, creado_en) de StockMovimiento.
+        if form.cleaned_data['desde']:
+            movs = movs.filter(creado_en__gte=fin_del_dia(form.cleaned_data['desde'] - timedelta(days=1)))
+        if form.cleaned_data['hasta']:
+            movs = movs.filter(creado_en__lt=fin_del_dia(form.cleaned_data['hasta']))
+        if form.cleaned_data['tipo']:
+            movs = movs.filter(tipo=form.cleaned_data['tipo'])
+    pagina = Paginator(movs, 50).get_page(request.GET.get('page'))
+    # Parámetros actuales sin la página, para los enlaces de paginación.
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
+    return render(request, 'tienda/almacen_movimientos_list.html', {
+        'movimientos': pagina,
+        'pagina': pagina,
+        'form': form,
+        'parametros': parametros.urlencode(),
+    })
+
+@login_required
+@solo_rol('almacen', 'gerencia')
+def recepcion_stock(request):
+    recepcion = None
+    if request.method == 'POST':
+        form = RecepcionStockForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Se lee el archivo subido como texto, línea a línea.
+            archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                recepcion = leer_recepcion(archivo)
+            except UnicodeDecodeError:
+                form.add_error('archivo', 'El archivo debe estar codificado en UTF-8.')
+            if recepcion and recepcion.valida and form.cleaned_data['aplicar']:
+                recepcion.aplicar(usuario=request.user, referencia=form.cleaned_data['referencia'])
+                messages.success(request, f'Recepción registrada: {recepcion.unidades} unidades de {len(recepcion.deltas)} productos.')
+                return redirect('almacen:movimientos')
+    else:
+        form = RecepcionStockForm()
+    return render(request, 'tienda/almacen_recepcion.html', {'form': form, 'recepcion': recepcion})